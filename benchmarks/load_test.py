@@ -0,0 +1,398 @@
+# benchmarks/load_test.py
+"""
+End-to-end HTTP load test of `wsgi:app` under gunicorn.
+
+Generates a synthetic catalog (the same seeded TMDb-like documents as
+benchmarks/recommendation_latency.py), builds the two model artifacts from
+it and writes the documents as JSON exports, so the app runs without MongoDB:
+STORAGE_BACKEND=json serves them from memory through JSONDatabase, which
+answers the same MongoDB-style lookups, and --backend sqlite serves them from
+an embedded SQLite file instead.
+
+For each gunicorn configuration (workers x threads) it boots the app the way
+the Procfile does, drives it with a closed-loop client for a fixed time and
+reports throughput, latency percentiles per route and the memory of every
+worker (RSS, and PSS / private memory on Linux, which show how much of the
+preloaded models the workers still share). The request mix is:
+
+    index    /
+    search   /search?query=<word from a title>
+    movie    /movie/<id>
+    api      /api/movie-recommendations/<id>
+
+with title ids drawn from a Zipf distribution over popularity rank, so a few
+titles get most of the traffic as on the real site.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --configs 1x4 2x4 4x1 --duration 30 --concurrency 32
+    python benchmarks/load_test.py --titles 100000 --backend sqlite --mix index=1,movie=6,api=3
+
+Generated catalogs are cached under benchmarks/.cache; results are written as
+JSON to benchmarks/results/ (or --output).
+"""
+import argparse
+import bisect
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from recommendation_latency import (CACHE_DIR, DEFAULT_SEED, GENRES, PROJECT_ROOT, RESULTS_DIR, _git_commit,
+                                    percentile, synthetic_documents)
+
+DEFAULT_TITLES = 10000
+DEFAULT_CONFIGS = ('1x4', '2x4', '4x1')
+DEFAULT_DURATION = 20
+DEFAULT_WARMUP = 5
+DEFAULT_CONCURRENCY = 16
+DEFAULT_ZIPF_EXPONENT = 1.1
+DEFAULT_MIX = 'index=1,search=2,movie=4,api=3'
+
+ROUTES = ('index', 'search', 'movie', 'api')
+
+# How long gunicorn gets to load the models and answer its first request
+BOOT_TIMEOUT = 300
+REQUEST_TIMEOUT = 30
+
+
+def _write_jsonl(path, documents):
+    with open(path, 'w', encoding='utf-8') as f:
+        for document in documents:
+            f.write(json.dumps(document) + '\n')
+
+
+def prepare_catalog(titles, seed=DEFAULT_SEED, backend='json', jobs=1):
+    """
+    Directory with the generated exports (data/), model artifacts (models/)
+    and, for the SQLite backend, the database; built on first use
+    """
+    from src.data.json_database import FILE_PREFIX
+    from src.models.build import build_model, save_model
+
+    # Artifacts are written as the build writes them, with a columnar catalog
+    root = os.path.join(CACHE_DIR, f'loadtest_{titles}_{seed}_catalog')
+    data_dir = os.path.join(root, 'data')
+    model_dir = os.path.join(root, 'models')
+    if not os.path.exists(os.path.join(model_dir, 'series_recommender.joblib')):
+        os.makedirs(data_dir, exist_ok=True)
+        os.makedirs(model_dir, exist_ok=True)
+        genres = [{'id': GENRES.index(name) + 1, 'name': name} for name in GENRES]
+        _write_jsonl(os.path.join(data_dir, f'{FILE_PREFIX}movie_genres.jsonl'), genres)
+        _write_jsonl(os.path.join(data_dir, f'{FILE_PREFIX}tv_genres.jsonl'), genres)
+        for kind, collection, model_file in (('movies', 'detailed_movies', 'movie_recommender.joblib'),
+                                             ('series', 'detailed_series', 'series_recommender.joblib')):
+            print(f"Generating {titles} {kind}")
+            documents = synthetic_documents(kind, titles, seed=seed)
+            _write_jsonl(os.path.join(data_dir, f'{FILE_PREFIX}{collection}.jsonl'), documents)
+            save_model(build_model(kind, documents, n_jobs=jobs), os.path.join(model_dir, model_file),
+                       compress=0, catalog=True)
+
+    sqlite_path = os.path.join(root, 'imdb_recommender.sqlite')
+    if backend == 'sqlite' and not os.path.exists(sqlite_path):
+        from src.data.sqlite_database import build
+        build(data_dir, sqlite_path)
+    return {'root': root, 'data_dir': data_dir, 'model_dir': model_dir, 'sqlite_path': sqlite_path}
+
+
+class RequestMix:
+    """Random request paths: routes by weight, title ids by Zipf over popularity rank"""
+
+    def __init__(self, catalog, weights, exponent=DEFAULT_ZIPF_EXPONENT):
+        from src.data.json_database import collection_path, read_documents
+
+        documents = list(read_documents(collection_path(catalog['data_dir'], 'detailed_movies')))
+        documents.sort(key=lambda document: document.get('popularity') or 0, reverse=True)
+        self.ids = [document['id'] for document in documents]
+        self.titles = [document.get('title') or '' for document in documents]
+        self.id_weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(self.ids) + 1)))
+        self.routes = [route for route in ROUTES if weights.get(route)]
+        self.route_weights = list(itertools.accumulate(weights[route] for route in self.routes))
+
+    def _rank(self, rng):
+        return bisect.bisect_left(self.id_weights, rng.random() * self.id_weights[-1])
+
+    def next(self, rng):
+        """(route, path) of the next request"""
+        route = self.routes[bisect.bisect_left(self.route_weights, rng.random() * self.route_weights[-1])]
+        if route == 'index':
+            return route, '/'
+        rank = self._rank(rng)
+        if route == 'search':
+            # A word of a popular title, or now and then a genre
+            words = self.titles[rank].split()[:-1]
+            query = rng.choice(words) if words and rng.random() < 0.8 else rng.choice(GENRES).lower()
+            return route, f'/search?query={quote(query)}'
+        if route == 'movie':
+            return route, f'/movie/{self.ids[rank]}'
+        return route, f'/api/movie-recommendations/{self.ids[rank]}'
+
+
+def parse_mix(text):
+    weights = {}
+    for item in text.split(','):
+        route, _, weight = item.partition('=')
+        if route.strip() not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route {route!r} in the mix, expected {', '.join(ROUTES)}")
+        weights[route.strip()] = float(weight or 1)
+    return weights
+
+
+def parse_config(text):
+    workers, _, threads = text.lower().partition('x')
+    try:
+        return int(workers), int(threads or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WORKERSxTHREADS such as 2x4, got {text!r}")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(catalog, backend, workers, threads, port, log_path, preload=True):
+    """Start gunicorn with the repo's config (as in the Procfile) and wait for it to serve /"""
+    env = dict(os.environ,
+               PORT=str(port),
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads),
+               GUNICORN_PRELOAD='1' if preload else '0',
+               PYTHONOPTIMIZE='1',
+               MODEL_PATH=catalog['model_dir'],
+               STORAGE_BACKEND=backend,
+               JSON_DATA_DIR=catalog['data_dir'],
+               SQLITE_PATH=catalog['sqlite_path'],
+               LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'))
+    env.pop('MODEL_STORE_URL', None)
+    log = open(log_path, 'ab')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                               cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    deadline = time.monotonic() + BOOT_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}, see {log_path}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=REQUEST_TIMEOUT)
+            connection.request('GET', '/')
+            status = connection.getresponse().status
+            connection.close()
+            if status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.25)
+    stop_server(process)
+    raise RuntimeError(f"gunicorn did not answer / within {BOOT_TIMEOUT}s, see {log_path}")
+
+
+def stop_server(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def process_memory(pid):
+    """RSS, PSS and private memory of a process in MB (None where /proc is unavailable)"""
+    memory = {'pid': pid, 'rss_mb': None, 'pss_mb': None, 'private_mb': None}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return memory
+
+    def mb(*names):
+        return sum(int(fields[name].split()[0]) for name in names if name in fields) / 1024
+
+    memory['rss_mb'] = mb('Rss')
+    memory['pss_mb'] = mb('Pss')
+    memory['private_mb'] = mb('Private_Clean', 'Private_Dirty')
+    return memory
+
+
+def worker_pids(master_pid):
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children', 'r') as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+class LoadClient:
+    """Closed loop: each thread sends its next request as soon as the previous one is answered"""
+
+    def __init__(self, port, mix, concurrency, seed=DEFAULT_SEED):
+        self.port = port
+        self.mix = mix
+        self.concurrency = concurrency
+        self.seed = seed
+        self.recording = False
+        self.stopped = threading.Event()
+        # Per thread: [(route, status, seconds)], appended only by that thread
+        self.samples = [[] for _ in range(concurrency)]
+
+    def _run(self, index):
+        rng = random.Random(f'{self.seed}-{index}')
+        samples = self.samples[index]
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=REQUEST_TIMEOUT)
+        while not self.stopped.is_set():
+            route, path = self.mix.next(rng)
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 0
+                connection.close()
+            elapsed = time.perf_counter() - start
+            if self.recording:
+                samples.append((route, status, elapsed))
+        connection.close()
+
+    def run(self, duration, warmup):
+        """Requests sent during `duration` seconds, after `warmup` unrecorded ones"""
+        threads = [threading.Thread(target=self._run, args=(index,), daemon=True) for index in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        time.sleep(warmup)
+        self.recording = True
+        start = time.perf_counter()
+        time.sleep(duration)
+        self.recording = False
+        elapsed = time.perf_counter() - start
+        self.stopped.set()
+        for thread in threads:
+            thread.join(REQUEST_TIMEOUT)
+        return [sample for samples in self.samples for sample in samples], elapsed
+
+
+def summarize(samples, elapsed):
+    """Throughput, status counts and latency percentiles (ms), in total and per route"""
+    def latency(route_samples):
+        values = sorted(seconds * 1000 for _, _, seconds in route_samples)
+        statuses = {}
+        for _, status, _ in route_samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary = {
+            'requests': len(values),
+            'rps': len(values) / elapsed if elapsed else 0.0,
+            'errors': sum(1 for _, status, _ in route_samples if status == 0 or status >= 500),
+            'statuses': statuses,
+        }
+        if values:
+            summary.update({'p50_ms': percentile(values, 0.50), 'p95_ms': percentile(values, 0.95),
+                            'p99_ms': percentile(values, 0.99), 'max_ms': values[-1]})
+        return summary
+
+    routes = {}
+    for sample in samples:
+        routes.setdefault(sample[0], []).append(sample)
+    summary = latency(samples)
+    summary['routes'] = {route: latency(route_samples) for route, route_samples in sorted(routes.items())}
+    return summary
+
+
+def run_config(catalog, backend, mix, workers, threads, args):
+    port = _free_port()
+    log_path = os.path.join(catalog['root'], f'gunicorn_{workers}x{threads}.log')
+    print(f"\n{workers} worker(s) x {threads} thread(s): starting gunicorn (log: {log_path})")
+    start = time.perf_counter()
+    process = start_server(catalog, backend, workers, threads, port, log_path, preload=not args.no_preload)
+    boot_s = time.perf_counter() - start
+    try:
+        client = LoadClient(port, mix, args.concurrency, seed=args.seed)
+        samples, elapsed = client.run(args.duration, args.warmup)
+        # Sampled after the run, so the workers have touched everything the mix needs
+        memory = {'master': process_memory(process.pid),
+                  'workers': [process_memory(pid) for pid in worker_pids(process.pid)]}
+    finally:
+        stop_server(process)
+
+    result = {'workers': workers, 'threads': threads, 'boot_s': boot_s, 'memory': memory}
+    result.update(summarize(samples, elapsed))
+    print(f"  {result['rps']:.1f} req/s, {result['errors']} errors, "
+          f"p50 {result.get('p50_ms', 0):.1f} ms, p95 {result.get('p95_ms', 0):.1f} ms, "
+          f"p99 {result.get('p99_ms', 0):.1f} ms")
+    for route, stats in result['routes'].items():
+        print(f"    {route:<7} {stats['rps']:8.1f} req/s  p50 {stats.get('p50_ms', 0):7.1f} ms  "
+              f"p95 {stats.get('p95_ms', 0):7.1f} ms  p99 {stats.get('p99_ms', 0):7.1f} ms")
+    for worker in memory['workers']:
+        if worker['rss_mb'] is not None:
+            print(f"    worker {worker['pid']}: RSS {worker['rss_mb']:.1f} MB, PSS {worker['pss_mb']:.1f} MB, "
+                  f"private {worker['private_mb']:.1f} MB")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load test of wsgi:app under gunicorn on a generated catalog")
+    parser.add_argument('--titles', type=int, default=DEFAULT_TITLES, help="Movies (and series) in the catalog")
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json', help="Storage backend to serve from")
+    parser.add_argument('--configs', type=parse_config, nargs='+', default=[parse_config(c) for c in DEFAULT_CONFIGS],
+                        help="gunicorn WORKERSxTHREADS configurations to run, e.g. 1x4 2x4 4x1")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="Measured seconds per configuration")
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP, help="Unmeasured seconds before each run")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Client connections")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Route weights (default {DEFAULT_MIX})")
+    parser.add_argument('--zipf', type=float, default=DEFAULT_ZIPF_EXPONENT, help="Zipf exponent of the title ids")
+    parser.add_argument('--no-preload', action='store_true', help="Run with GUNICORN_PRELOAD=0")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--jobs', type=int, default=1, help="Worker processes for the model builds")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/load-<time>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    catalog = prepare_catalog(args.titles, seed=args.seed, backend=args.backend, jobs=args.jobs)
+    mix = RequestMix(catalog, args.mix, exponent=args.zipf)
+
+    results = []
+    for workers, threads in args.configs:
+        try:
+            results.append(run_config(catalog, args.backend, mix, workers, threads, args))
+        except RuntimeError as e:
+            print(f"  {e}")
+            results.append({'workers': workers, 'threads': threads, 'error': str(e)})
+
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'titles': args.titles,
+        'backend': args.backend,
+        'duration_s': args.duration,
+        'concurrency': args.concurrency,
+        'mix': args.mix,
+        'zipf_exponent': args.zipf,
+        'preload': not args.no_preload,
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
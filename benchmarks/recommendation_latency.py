@@ -0,0 +1,335 @@
+# benchmarks/recommendation_latency.py
+"""
+Latency benchmark for the recommendation hot paths.
+
+Builds synthetic movie and series catalogs of 1k, 10k and 100k titles with
+the real build pipeline (src/models/build.py), or loads recorded artifacts,
+and times the operations the web app runs per request:
+
+    movie_recommendations    content_based.get_movie_recommendations_by_id
+    series_hybrid            content_based.get_hybrid_series_recommendations_by_id
+    title_search             content_based.search_titles (the /search route)
+    id_lookup                DetailResolver.model_row (the detail pages)
+
+It reports p50/p95/p99 per operation and the memory each loaded catalog
+takes, and writes everything to a JSON file so runs can be compared across
+commits:
+
+    python benchmarks/recommendation_latency.py
+    python benchmarks/recommendation_latency.py --sizes 1000 10000 --output before.json
+    python benchmarks/recommendation_latency.py --compare before.json --max-regression 0.15
+    python benchmarks/recommendation_latency.py --movie-artifact models/movie_recommender.joblib
+
+Synthetic artifacts are cached under benchmarks/.cache, so only the first
+run at a size pays for the build.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_ITERATIONS = 200
+DEFAULT_WARMUP = 20
+DEFAULT_SEED = 42
+CACHE_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', '.cache')
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+
+# Regressions smaller than this (in ms) are noise, whatever the ratio
+MIN_REGRESSION_MS = 0.05
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+          'Fantasy', 'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction',
+          'Thriller', 'War', 'Western']
+VOCABULARY_SIZE = 5000
+
+
+def _word(rng):
+    # Skewed towards low ranks, like real overview and keyword text
+    return f'w{int(rng.paretovariate(1.2)) % VOCABULARY_SIZE}'
+
+
+def _people(rng, prefix, count, pool):
+    return [{'name': f'{prefix}{rng.randrange(pool)}'} for _ in range(count)]
+
+
+def synthetic_documents(kind, n, seed=DEFAULT_SEED):
+    """Detailed TMDb-like documents with the fields the build reads"""
+    rng = random.Random(f'{kind}-{n}-{seed}')
+    documents = []
+    for title_id in range(1, n + 1):
+        words = ' '.join(_word(rng) for _ in range(rng.randint(1, 4)))
+        doc = {
+            'id': title_id,
+            'genres': [{'id': GENRES.index(name) + 1, 'name': name} for name in rng.sample(GENRES, rng.randint(1, 3))],
+            'overview': ' '.join(_word(rng) for _ in range(rng.randint(20, 60))),
+            'vote_average': round(rng.uniform(1, 10), 1),
+            'vote_count': int(rng.paretovariate(1.1) * 10),
+            'popularity': round(rng.paretovariate(1.5) * 5, 3),
+            'poster_path': f'/poster{title_id}.jpg',
+            'production_companies': _people(rng, 'company', rng.randint(1, 3), max(n // 20, 10)),
+            'credits': {'cast': _people(rng, 'actor', 8, max(n, 50))},
+        }
+        if kind == 'movies':
+            doc['title'] = f'{words} {title_id}'
+            doc['keywords'] = {'keywords': [{'name': _word(rng)} for _ in range(rng.randint(3, 12))]}
+            doc['credits']['crew'] = [{'name': f'director{rng.randrange(max(n // 5, 10))}', 'job': 'Director'}]
+        else:
+            doc['name'] = f'{words} {title_id}'
+            doc['keywords'] = {'results': [{'name': _word(rng)} for _ in range(rng.randint(3, 12))]}
+            doc['created_by'] = _people(rng, 'creator', rng.randint(1, 2), max(n // 5, 10))
+            doc['networks'] = _people(rng, 'network', 1, 40)
+        documents.append(doc)
+    return documents
+
+
+def synthetic_artifact(kind, n, backend='matrix', seed=DEFAULT_SEED, jobs=1):
+    """Path of a cached synthetic artifact, building it on first use"""
+    from src.models.build import build_model, save_model
+
+    path = os.path.join(CACHE_DIR, f'{kind}_{n}_{backend}_{seed}.joblib')
+    if not os.path.exists(path):
+        print(f"Building synthetic {kind} artifact with {n} titles ({backend})")
+        model = build_model(kind, synthetic_documents(kind, n, seed=seed), backend=backend, n_jobs=jobs)
+        save_model(model, path, compress=0)
+    return path
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(operation, arguments, warmup_arguments=()):
+    """
+    Latency summary of operation(argument) over every argument, in ms, after
+    untimed calls on warmup_arguments (a separate sample, so no timed call
+    repeats a warm-up call)
+    """
+    for argument in warmup_arguments:
+        operation(argument)
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter_ns()
+        operation(argument)
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    samples.sort()
+    return {
+        'iterations': len(samples),
+        'p50_ms': percentile(samples, 0.50),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+        'mean_ms': statistics.fmean(samples),
+        'max_ms': samples[-1],
+    }
+
+
+def search_queries(df, title_field, rng, count):
+    """Words taken from catalog titles, plus genre names"""
+    titles = df[title_field].dropna().tolist()
+    queries = [rng.choice(rng.choice(titles).split()[:-1] or ['w1']) for _ in range(count)]
+    for i in range(0, count, 5):
+        queries[i] = rng.choice(GENRES).lower()
+    return queries
+
+
+def probe_memory(kind, path):
+    """RSS growth from loading an artifact (and its id index), in MB; meant for a fresh interpreter"""
+    # Libraries are imported first so their own memory isn't counted
+    import joblib  # noqa: F401
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    from src.data.details import DetailResolver
+    from src.models.catalog import load_artifact
+
+    gc.collect()
+    before_mb = rss_mb()
+    model = load_artifact(path)
+    DetailResolver('movie' if kind == 'movies' else 'series', model, db=None)
+    gc.collect()
+    return rss_mb() - before_mb
+
+
+def load_memory_mb(kind, path):
+    """
+    Memory an artifact takes once loaded, measured in a new process: in this
+    one, memory freed by earlier builds and loads would be reused and hide it
+    """
+    code = (f"import json, sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+            f"import recommendation_latency as r; print(json.dumps(r.probe_memory({kind!r}, {path!r})))")
+    try:
+        output = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True,
+                                text=True, check=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError) as e:
+        print(f"Could not measure the memory of {path}: {e}")
+        return None
+
+
+def benchmark_model(kind, path, iterations, seed):
+    """Load one artifact and time the operations that apply to it"""
+    from src.data.details import DetailResolver
+    from src.models import content_based
+    from src.models.catalog import load_artifact
+    from src.data.normalize import canonical_id
+
+    memory_mb = load_memory_mb(kind, path)
+    start = time.perf_counter()
+    model = load_artifact(path)
+    load_s = time.perf_counter() - start
+    resolver = DetailResolver('movie' if kind == 'movies' else 'series', model, db=None)
+
+    df_key, title_field = ('movies_df', 'title') if kind == 'movies' else ('series_df', 'name')
+    df = model[df_key]
+    rng = random.Random(seed)
+    ids = [canonical_id(title_id) for title_id in df['id'].tolist()]
+    sample_ids = [rng.choice(ids) for _ in range(iterations)]
+    warmup_ids = [rng.choice(ids) for _ in range(DEFAULT_WARMUP)]
+
+    operations = {}
+    if kind == 'movies':
+        operations['movie_recommendations'] = measure(
+            lambda title_id: content_based.get_movie_recommendations_by_id(title_id, model, top_n=9),
+            sample_ids, warmup_ids)
+    else:
+        operations['series_hybrid'] = measure(
+            lambda title_id: content_based.get_hybrid_series_recommendations_by_id(title_id, model, top_n=9),
+            sample_ids, warmup_ids)
+    operations['title_search'] = measure(
+        lambda query: content_based.search_titles(df, query, title_field=title_field),
+        search_queries(df, title_field, rng, max(iterations // 4, 20)),
+        search_queries(df, title_field, rng, DEFAULT_WARMUP))
+    operations['id_lookup'] = measure(resolver.model_row, sample_ids, warmup_ids)
+
+    return {
+        'kind': kind,
+        'artifact': os.path.relpath(path, PROJECT_ROOT),
+        'titles': len(df),
+        'similarity_backend': model.get('similarity_backend', 'matrix'),
+        'load_s': load_s,
+        'memory_mb': memory_mb,
+        'operations': operations,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _result_key(result, operation):
+    return (result['kind'], result['titles'], result['similarity_backend'], operation)
+
+
+def compare(current, baseline, max_regression):
+    """Print p50/p95 changes against a previous run; returns the regressions beyond max_regression"""
+    previous = {_result_key(result, name): stats
+                for result in baseline['results'] for name, stats in result['operations'].items()}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at', '?')})")
+    for result in current['results']:
+        for name, stats in result['operations'].items():
+            old = previous.get(_result_key(result, name))
+            if old is None:
+                continue
+            line = f"  {result['kind']:<7} {result['titles']:>7} {name:<22}"
+            for metric in ('p50_ms', 'p95_ms'):
+                change = stats[metric] / old[metric] - 1 if old[metric] else 0.0
+                line += f" {metric[:3]} {old[metric]:8.3f} -> {stats[metric]:8.3f} ({change:+.0%})"
+                if change > max_regression and stats[metric] - old[metric] > MIN_REGRESSION_MS:
+                    regressions.append(f"{result['kind']} {result['titles']} {name} {metric} {change:+.0%}")
+            print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency benchmark for recommendations, search and id lookup")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Synthetic catalog sizes")
+    parser.add_argument('--kinds', nargs='+', choices=['movies', 'series'], default=['movies', 'series'])
+    parser.add_argument('--backend', choices=['matrix', 'features'], default='matrix',
+                        help="Similarity backend of the synthetic artifacts")
+    parser.add_argument('--movie-artifact', help="Benchmark a recorded movie artifact instead of synthetic ones")
+    parser.add_argument('--series-artifact', help="Benchmark a recorded series artifact instead of synthetic ones")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help="Timed calls per operation")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--jobs', type=int, default=1, help="Worker processes for synthetic builds")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', help="Previous results file to compare with")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="With --compare, exit 1 if a p50/p95 grows by more than this fraction")
+    args = parser.parse_args(argv)
+
+    recorded = {'movies': args.movie_artifact, 'series': args.series_artifact}
+    targets = []
+    for kind in args.kinds:
+        if recorded[kind]:
+            targets.append((kind, recorded[kind]))
+        elif not any(recorded.values()):
+            targets.extend((kind, synthetic_artifact(kind, n, backend=args.backend, seed=args.seed, jobs=args.jobs))
+                           for n in args.sizes)
+
+    results = []
+    for kind, path in targets:
+        result = benchmark_model(kind, path, args.iterations, args.seed)
+        results.append(result)
+        print(f"\n{kind} ({result['titles']} titles, {result['similarity_backend']}): "
+              f"loaded in {result['load_s']:.2f}s, "
+              f"{'?' if result['memory_mb'] is None else format(result['memory_mb'], '.1f')} MB")
+        for name, stats in result['operations'].items():
+            print(f"  {name:<22} p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms  "
+                  f"p99 {stats['p99_ms']:8.3f} ms")
+
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'seed': args.seed,
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# benchmarks/startup_report.py
+"""
+Startup cost of the web process.
+
+Runs `python -X importtime -c "import wsgi"` in a fresh interpreter and
+reports the slowest top-level imports, then times a fresh process from spawn
+to the response of its first request (through Flask's test client):
+
+    python benchmarks/startup_report.py
+    python benchmarks/startup_report.py --target-ms 1200 --json startup.json
+
+Exits with status 1 if time-to-first-request misses the target or if one of
+the heavy modules (pandas, numpy, pymongo, boto3, ...) is imported at startup,
+so the check can run in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Time from process spawn to the first response, in milliseconds
+DEFAULT_TARGET_MS = 1500
+
+# A page that needs neither a model nor the database
+DEFAULT_PATH = '/movie-analysis'
+
+# Modules that must only be imported when a request needs them
+DEFERRED_MODULES = ('pandas', 'numpy', 'scipy', 'sklearn', 'joblib', 'pymongo', 'boto3', 'botocore', 'requests')
+
+FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import wsgi
+imported = time.perf_counter()
+response = wsgi.app.test_client().get(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({'import_ms': 1000 * (imported - start), 'request_ms': 1000 * (done - imported),
+                  'status': response.status_code}))
+"""
+
+
+def _environment():
+    env = dict(os.environ)
+    # Measure the lazy path even if the deploy environment preloads
+    env['PRELOAD_MODELS'] = '0'
+    env.pop('MODEL_STORE_URL', None)
+    return env
+
+
+def measure_imports(module='wsgi'):
+    """(self_us, cumulative_us, depth, name) for every import made by `import module`"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=PROJECT_ROOT, env=_environment(), capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return rows
+
+
+def top_level_costs(rows):
+    """Cumulative import time per root package, slowest first"""
+    costs = {}
+    for _, cumulative_us, depth, name in rows:
+        # Nested imports are already counted in their parent's cumulative time
+        if depth == 0:
+            root = name.split('.')[0]
+            costs[root] = costs.get(root, 0) + cumulative_us
+    return sorted(costs.items(), key=lambda item: -item[1])
+
+
+def measure_first_request(path=DEFAULT_PATH, repeats=3):
+    """Median spawn-to-first-response time of fresh processes"""
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', FIRST_REQUEST_SCRIPT, path], cwd=PROJECT_ROOT,
+                                env=_environment(), capture_output=True, text=True)
+        total_ms = 1000 * (time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"First request failed:\n{result.stderr[-2000:]}")
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        run['total_ms'] = total_ms
+        runs.append(run)
+    return {
+        'path': path,
+        'status': runs[-1]['status'],
+        'import_ms': statistics.median(run['import_ms'] for run in runs),
+        'request_ms': statistics.median(run['request_ms'] for run in runs),
+        'total_ms': statistics.median(run['total_ms'] for run in runs),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time and time-to-first-request report for the web app")
+    parser.add_argument('--module', default='wsgi', help="Module imported at startup")
+    parser.add_argument('--path', default=DEFAULT_PATH, help="Route requested first")
+    parser.add_argument('--repeats', type=int, default=3, help="Fresh processes timed (median is reported)")
+    parser.add_argument('--top', type=int, default=15, help="Top-level imports listed")
+    parser.add_argument('--target-ms', type=float, default=DEFAULT_TARGET_MS, help="Time-to-first-request target")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    rows = measure_imports(args.module)
+    costs = top_level_costs(rows)
+    imported = {name.split('.')[0] for _, _, _, name in rows}
+    deferred = sorted(module for module in DEFERRED_MODULES if module in imported)
+
+    print(f"\nSlowest imports of `import {args.module}` (cumulative ms)")
+    for name, cumulative_us in costs[:args.top]:
+        print(f"  {name:<30} {cumulative_us / 1000:>9.1f}")
+    print(f"  {'total':<30} {sum(us for _, us in costs) / 1000:>9.1f}")
+
+    first_request = measure_first_request(args.path, repeats=args.repeats)
+    print(f"\nTime to first request ({first_request['path']}, status {first_request['status']}): "
+          f"{first_request['total_ms']:.0f} ms (import {first_request['import_ms']:.0f} ms, "
+          f"request {first_request['request_ms']:.0f} ms), target {args.target_ms:.0f} ms")
+
+    failures = []
+    if first_request['total_ms'] > args.target_ms:
+        failures.append(f"time to first request {first_request['total_ms']:.0f} ms exceeds {args.target_ms:.0f} ms")
+    if deferred:
+        failures.append(f"imported at startup: {', '.join(deferred)}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'imports_ms': {name: us / 1000 for name, us in costs}, 'first_request': first_request,
+                       'deferred_imported': deferred, 'target_ms': args.target_ms, 'failures': failures},
+                      f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
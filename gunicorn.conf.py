@@ -0,0 +1,76 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings for the web app (see Procfile).
+
+With GUNICORN_PRELOAD=1 (the default) the master imports wsgi:app and loads
+both recommendation models before forking, so every worker shares the
+master's copy of the model memory instead of loading its own. The big parts
+of a model are NumPy buffers (similarity matrix, feature matrix, numeric
+columns), which no request writes to, so their pages stay shared.
+
+What still breaks sharing is Python writing to object headers: the cyclic
+garbage collector marks every tracked object it scans, and refcounts change
+whenever an object is touched. The hooks below follow the gc.freeze()
+recipe: no collection in the master while the models load, then everything
+allocated so far is moved to the permanent generation right before the fork
+so the collector in the workers never touches it.
+
+gc.freeze() does not stop refcount writes, though, so the serving data keeps
+no per-title Python objects for requests to touch: the frames come from the
+columnar catalog (src/models/catalog.py) as NumPy arrays and Arrow strings
+over the mapped files (pyarrow is in requirements.txt), genre lists are shared
+per distinct list, and DetailResolver finds rows by binary search over an id
+array and reads them from the column arrays. Objects a request creates are
+its own and freed when it ends. Each worker logs its private memory after it
+boots; benchmarks/load_test.py reports each worker's RSS, PSS and private
+memory under traffic.
+
+The storage backend is not opened in the master when it is MongoDB: a
+MongoClient is not fork-safe, so each worker connects on its first request.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+# More than one thread switches gunicorn to the gthread worker; the shared
+# serving state is read-only, so threads can overlap their MongoDB waits
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = 240
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+if preload_app:
+    # create_app() loads the models when PRELOAD_MODELS is set
+    os.environ.setdefault('PRELOAD_MODELS', '1')
+    gc.disable()
+
+
+def _private_mb():
+    """Private (unshared) memory of this process in MB, or None off Linux"""
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    kb = sum(int(fields[name].split()[0]) for name in ('Private_Clean', 'Private_Dirty') if name in fields)
+    return kb / 1024
+
+
+def when_ready(server):
+    if preload_app:
+        # The app and models are loaded; keep the collector away from them in every worker
+        gc.collect()
+        gc.freeze()
+        server.log.info(f"Froze {gc.get_freeze_count()} objects before forking workers")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
+
+
+def post_worker_init(worker):
+    private_mb = _private_mb()
+    if private_mb is not None:
+        worker.log.info(f"Worker {worker.pid} private memory after boot: {private_mb:.1f} MB")
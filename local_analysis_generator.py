@@ -22,6 +22,7 @@ def save_plot(fig, filename):
 
 # Import Database 
 from src.data.database import Database
+from src.data.normalize import genre_names
 
 print("Connecting to MongoDB...")
 db = Database()
@@ -31,27 +32,14 @@ print("MongoDB connection established")
 print("\nGenerating movie analysis...")
 
 # Get movie data
-mongo_movies = db.db.detailed_movies.find({})
+mongo_movies = db.db.detailed_movies.find({}, {'_id': 0})
 movies_df = pd.DataFrame(list(mongo_movies))
 print(f"Retrieved {len(movies_df)} movies from MongoDB")
 
-# Format data
+# Format data (the import stores genre_names; older imports only have genres)
 if 'genres' in movies_df.columns and 'genre_names' not in movies_df.columns:
     print("Mapping 'genres' field to 'genre_names'")
-    
-    def extract_genre_names(genres):
-        if not genres:
-            return []
-        names = []
-        if isinstance(genres, list):
-            for genre in genres:
-                if isinstance(genre, dict) and 'name' in genre:
-                    names.append(genre['name'])
-                elif isinstance(genre, str):
-                    names.append(genre)
-        return names
-    
-    movies_df['genre_names'] = movies_df['genres'].apply(extract_genre_names)
+    movies_df['genre_names'] = movies_df['genres'].apply(genre_names)
 
 # Extract year from release_date if available
 if 'release_date' in movies_df.columns:
@@ -421,7 +409,7 @@ print("Saved movie stats to JSON")
 print("\nGenerating series analysis...")
 
 # Get series data
-mongo_series = db.db.detailed_series.find({})
+mongo_series = db.db.detailed_series.find({}, {'_id': 0})
 series_df = pd.DataFrame(list(mongo_series))
 print(f"Retrieved {len(series_df)} series from MongoDB")
 
@@ -429,8 +417,7 @@ print(f"Retrieved {len(series_df)} series from MongoDB")
 if 'genres' in series_df.columns and 'genre_names' not in series_df.columns:
     print("Mapping 'genres' field to 'genre_names'")
     
-    # Extract genre names (reuse function from above)
-    series_df['genre_names'] = series_df['genres'].apply(extract_genre_names)
+    series_df['genre_names'] = series_df['genres'].apply(genre_names)
 
 # Extract year from first_air_date if available
 if 'first_air_date' in series_df.columns:
@@ -1,9 +1,46 @@
+import argparse
 import json
 import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne
 from dotenv import load_dotenv
 
+from src.data.normalize import CARD_COLLECTIONS, card, normalize_document
+
+# Collections imported from the raw data files. Genre files wrap their
+# records in a 'genres' key; detailed files are optional. Detailed records are
+# normalized as 'movie'/'series' documents (see src/data/normalize.py) and
+# also written to a compact card collection.
+IMPORT_SPECS = [
+    {'collection': 'movies', 'label': 'movies', 'path': 'data/raw_data/movies.json', 'key': None, 'optional': False, 'kind': None},
+    {'collection': 'series', 'label': 'TV series', 'path': 'data/raw_data/tv_series.json', 'key': None, 'optional': False, 'kind': None},
+    {'collection': 'movie_genres', 'label': 'movie genres', 'path': 'data/raw_data/movie_genres.json', 'key': 'genres', 'optional': False, 'kind': None},
+    {'collection': 'tv_genres', 'label': 'TV genres', 'path': 'data/raw_data/tv_genres.json', 'key': 'genres', 'optional': False, 'kind': None},
+    {'collection': 'detailed_movies', 'label': 'detailed movies', 'path': 'data/raw_data/detailed_movies.json', 'key': None, 'optional': True, 'kind': 'movie'},
+    {'collection': 'detailed_series', 'label': 'detailed series', 'path': 'data/raw_data/detailed_series.json', 'key': None, 'optional': True, 'kind': 'series'},
+]
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_WORKERS = 4
+
+# Suffixes for the blue/green generations of each collection
+STAGING_SUFFIX = '_staging'
+PREVIOUS_SUFFIX = '_previous'
+
+# Secondary indexes built on every new generation (all collections get a unique 'id')
+EXTRA_INDEXES = {
+    'movies': ['title'],
+    'series': ['name'],
+    'detailed_movies': ['title'],
+    'detailed_series': ['name'],
+    'movie_cards': ['title'],
+    'series_cards': ['name'],
+}
+
 def remove_duplicates(data_list):
     """
     Remove duplicate entries from a list of dictionaries
@@ -41,132 +78,324 @@ def remove_duplicates(data_list):
     
     return deduplicated_data
 
-def import_data_to_mongodb():
+def remove_duplicate_ids(data_list):
+    """
+    Keep only the first record for each 'id'.
+    Upserts are keyed on 'id', so two records sharing an id would
+    race each other inside an unordered bulk write.
+    """
+    seen = set()
+    unique = []
+    skipped = 0
+    for record in data_list:
+        record_id = record.get('id')
+        if record_id is None:
+            skipped += 1
+            continue
+        if record_id in seen:
+            continue
+        seen.add(record_id)
+        unique.append(record)
+
+    removed = len(data_list) - len(unique) - skipped
+    if removed > 0:
+        print(f"Removed {removed} records with a repeated id")
+    if skipped > 0:
+        print(f"Skipped {skipped} records without an id")
+    return unique
+
+def load_records(spec):
+    """Load and deduplicate the records for one import spec"""
+    path = spec['path']
+    if not os.path.exists(path):
+        if spec['optional']:
+            return None
+        raise FileNotFoundError(path)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if spec['key'] is not None:
+        if spec['key'] not in data:
+            return None
+        data = data[spec['key']]
+
+    if not data:
+        return None
+
+    print(f"Original {spec['label']} count: {len(data)}")
+    # Remove duplicates
+    data = remove_duplicates(data)
+    print(f"Deduplicated {spec['label']} count: {len(data)}")
+    # Store documents in the shape the web app reads, so it does no reshaping per request
+    return [normalize_document(record, spec['kind']) for record in data]
+
+def iter_batches(records, batch_size):
+    """Yield consecutive fixed-size slices of records"""
+    for start in range(0, len(records), batch_size):
+        yield records[start:start + batch_size]
+
+def bulk_import_collection(collection, records, label, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Upsert records into a collection in batches, keyed on 'id'.
+    Existing documents stay readable for the whole import; documents
+    that are no longer in the source are removed only at the end.
+    """
+    records = remove_duplicate_ids(records)
+    if not records:
+        print(f"[{label}] Nothing to import")
+        return 0
+
+    # Upserts look documents up by id, so make sure that is indexed
+    # (a swap import may already have built it as a unique index)
+    if 'id_1' not in collection.index_information():
+        collection.create_index('id')
+
+    total_batches = (len(records) + batch_size - 1) // batch_size
+    import_start = time.perf_counter()
+
+    for batch_number, batch in enumerate(iter_batches(records, batch_size), start=1):
+        batch_start = time.perf_counter()
+        operations = [ReplaceOne({'id': record['id']}, record, upsert=True) for record in batch]
+        result = collection.bulk_write(operations, ordered=False)
+        elapsed = time.perf_counter() - batch_start
+        rate = len(batch) / elapsed if elapsed > 0 else float('inf')
+        print(f"[{label}] Batch {batch_number}/{total_batches}: {len(batch)} docs in {elapsed:.2f}s "
+              f"({rate:.0f} docs/s, {result.upserted_count} inserted, {result.modified_count} updated)")
+
+    # Drop documents that disappeared from the source
+    current_ids = [record['id'] for record in records]
+    removed = collection.delete_many({'id': {'$nin': current_ids}}).deleted_count
+
+    elapsed = time.perf_counter() - import_start
+    rate = len(records) / elapsed if elapsed > 0 else float('inf')
+    print(f"[{label}] Imported {len(records)} {label} in {elapsed:.2f}s ({rate:.0f} docs/s), removed {removed} stale")
+    return len(records)
+
+def ensure_indexes(collection, name):
+    """Build the lookup indexes a live collection is expected to have"""
+    collection.create_index('id', unique=True)
+    for field in EXTRA_INDEXES.get(name, []):
+        collection.create_index(field)
+
+def stage_import_collection(db, name, records, label, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    First half of a blue/green import: load and index <name>_staging. The
+    live collection is untouched; promote_staging puts the new generation live.
+    Returns the number of staged records (0 if there was nothing to stage).
+    """
+    records = remove_duplicate_ids(records)
+    if not records:
+        print(f"[{label}] Nothing to import")
+        return 0
+
+    staging = db[name + STAGING_SUFFIX]
+
+    # Start from a clean staging collection (a failed earlier run may have left one)
+    staging.drop()
+
+    total_batches = (len(records) + batch_size - 1) // batch_size
+    import_start = time.perf_counter()
+    for batch_number, batch in enumerate(iter_batches(records, batch_size), start=1):
+        batch_start = time.perf_counter()
+        # insert_many adds _id to the dicts, so hand it copies
+        staging.insert_many([dict(record) for record in batch], ordered=False)
+        elapsed = time.perf_counter() - batch_start
+        rate = len(batch) / elapsed if elapsed > 0 else float('inf')
+        print(f"[{label}] Staging batch {batch_number}/{total_batches}: {len(batch)} docs in {elapsed:.2f}s ({rate:.0f} docs/s)")
+
+    # Build indexes before the collection goes live
+    index_start = time.perf_counter()
+    ensure_indexes(staging, name)
+    print(f"[{label}] Built indexes on {staging.name} in {time.perf_counter() - index_start:.2f}s")
+
+    elapsed = time.perf_counter() - import_start
+    print(f"[{label}] Staged {len(records)} {label} in {elapsed:.2f}s")
+    return len(records)
+
+def promote_staging(db, name):
+    """
+    Second half of a blue/green import: rename <name>_staging over the live
+    collection, keeping the generation it replaces as <name>_previous.
+    """
+    previous_name = name + PREVIOUS_SUFFIX
+
+    # Keep the current generation for rollback. $out writes to a temporary
+    # collection and renames it, so the live collection stays readable.
+    if name in db.list_collection_names():
+        db[name].aggregate([{'$match': {}}, {'$out': previous_name}])
+        ensure_indexes(db[previous_name], name)
+        print(f"Saved current generation of {name} as {previous_name}")
+
+    # Atomic swap: readers see either the old or the new generation, never neither
+    db[name + STAGING_SUFFIX].rename(name, dropTarget=True)
+    print(f"Swapped {name + STAGING_SUFFIX} into {name}")
+
+def promote_all(db, names):
+    """
+    Promote every staged collection, or none: if one rename fails, the
+    collections already promoted are rolled back to their previous generation
+    """
+    promoted = []
+    for name in names:
+        try:
+            promote_staging(db, name)
+        except Exception:
+            for done in reversed(promoted):
+                rollback_collection(db, done)
+            raise
+        promoted.append(name)
+
+def rollback_collection(db, name):
+    """Swap <name>_previous back in as the live collection"""
+    previous_name = name + PREVIOUS_SUFFIX
+    if previous_name not in db.list_collection_names():
+        print(f"No previous generation for {name}, skipping")
+        return False
+
+    rollback_name = name + '_rollback'
+    has_live = name in db.list_collection_names()
+
+    # Snapshot the current live generation so the rollback itself can be undone
+    if has_live:
+        db[name].aggregate([{'$match': {}}, {'$out': rollback_name}])
+
+    db[previous_name].rename(name, dropTarget=True)
+
+    if has_live:
+        ensure_indexes(db[rollback_name], name)
+        db[rollback_name].rename(previous_name, dropTarget=True)
+
+    print(f"Rolled back {name} to its previous generation")
+    return True
+
+def rollback_import():
+    """Roll every collection back to the generation before the last swap import"""
+    db = connect()
+    for spec in IMPORT_SPECS:
+        rollback_collection(db, spec['collection'])
+        if spec['kind']:
+            rollback_collection(db, CARD_COLLECTIONS[spec['kind']])
+
+def replace_import_collection(collection, records, label):
+    """Clear the collection and insert all records in one request"""
+    # Clear existing data
+    collection.delete_many({})
+    # Insert new data
+    collection.insert_many(records)
+    print(f"Imported {len(records)} {label}")
+    return len(records)
+
+def import_records(db, name, records, label, mode, batch_size):
+    """Import prepared records into one collection with the chosen mode"""
+    if mode == 'swap':
+        # Only staged here; import_data_to_mongodb promotes once every collection is staged
+        return stage_import_collection(db, name, records, label, batch_size)
+    if mode == 'bulk':
+        return bulk_import_collection(db[name], records, label, batch_size)
+    return replace_import_collection(db[name], records, label)
+
+def import_spec(db, spec, mode, batch_size):
+    """
+    Load one source file and import it into its collection (and its card
+    collection). Returns the names of the collections that received records.
+    """
+    print(f"Importing {spec['label']}...")
+    records = load_records(spec)
+    if records is None:
+        return []
+
+    # insert_many adds _id to the dicts it is given, so derive the cards first
+    cards = [card(record, spec['kind']) for record in records] if spec['kind'] else None
+    imported = []
+    if import_records(db, spec['collection'], records, spec['label'], mode, batch_size):
+        imported.append(spec['collection'])
+    if cards and import_records(db, CARD_COLLECTIONS[spec['kind']], cards, spec['label'] + ' cards', mode, batch_size):
+        imported.append(CARD_COLLECTIONS[spec['kind']])
+    return imported
+
+def connect():
+    """Connect to the imdb_recommender database"""
     # Load environment variables
     load_dotenv(dotenv_path="data\\.env")
-    
+
     # Get MongoDB connection string from environment variables
     mongo_uri = os.getenv('MONGO_URI')
-    
+
     # Connect to MongoDB
     client = MongoClient(mongo_uri)
-    db = client['imdb_recommender']
-    
-    # Create collections
-    movies_collection = db['movies']
-    series_collection = db['series']
-    movie_genres_collection = db['movie_genres']
-    tv_genres_collection = db['tv_genres']
-    
-    # Import movies
-    print("Importing movies...")
-    with open('data/raw_data/movies.json', 'r', encoding='utf-8') as f:
-        movies_data = json.load(f)
-    
-    if movies_data:
-        print(f"Original movie count: {len(movies_data)}")
-        # Remove duplicates
-        movies_data = remove_duplicates(movies_data)
-        print(f"Deduplicated movie count: {len(movies_data)}")
-        
-        # Clear existing data
-        movies_collection.delete_many({})
-        # Insert new data
-        movies_collection.insert_many(movies_data)
-        print(f"Imported {len(movies_data)} movies")
-    
-    # Import TV series
-    print("Importing TV series...")
-    with open('data/raw_data/tv_series.json', 'r', encoding='utf-8') as f:
-        series_data = json.load(f)
-    
-    if series_data:
-        print(f"Original TV series count: {len(series_data)}")
-        # Remove duplicates
-        series_data = remove_duplicates(series_data)
-        print(f"Deduplicated TV series count: {len(series_data)}")
-        
-        # Clear existing data
-        series_collection.delete_many({})
-        # Insert new data
-        series_collection.insert_many(series_data)
-        print(f"Imported {len(series_data)} TV series")
-    
-    # Import movie genres
-    print("Importing movie genres...")
-    with open('data/raw_data/movie_genres.json', 'r', encoding='utf-8') as f:
-        movie_genres_data = json.load(f)
-    
-    if 'genres' in movie_genres_data:
-        movie_genres = movie_genres_data['genres']
-        print(f"Original movie genres count: {len(movie_genres)}")
-        # Remove duplicates
-        movie_genres = remove_duplicates(movie_genres)
-        print(f"Deduplicated movie genres count: {len(movie_genres)}")
-        
-        # Clear existing data
-        movie_genres_collection.delete_many({})
-        # Insert new data
-        movie_genres_collection.insert_many(movie_genres)
-        print(f"Imported {len(movie_genres)} movie genres")
-    
-    # Import TV genres
-    print("Importing TV genres...")
-    with open('data/raw_data/tv_genres.json', 'r', encoding='utf-8') as f:
-        tv_genres_data = json.load(f)
-    
-    if 'genres' in tv_genres_data:
-        tv_genres = tv_genres_data['genres']
-        print(f"Original TV genres count: {len(tv_genres)}")
-        # Remove duplicates
-        tv_genres = remove_duplicates(tv_genres)
-        print(f"Deduplicated TV genres count: {len(tv_genres)}")
-        
-        # Clear existing data
-        tv_genres_collection.delete_many({})
-        # Insert new data
-        tv_genres_collection.insert_many(tv_genres)
-        print(f"Imported {len(tv_genres)} TV genres")
-    
-    # Import detailed movie data
-    if os.path.exists('data/raw_data/detailed_movies.json'):
-        print("Importing detailed movie data...")
-        with open('data/raw_data/detailed_movies.json', 'r', encoding='utf-8') as f:
-            detailed_movies = json.load(f)
-        
-        if detailed_movies:
-            print(f"Original detailed movies count: {len(detailed_movies)}")
-            # Remove duplicates
-            detailed_movies = remove_duplicates(detailed_movies)
-            print(f"Deduplicated detailed movies count: {len(detailed_movies)}")
-            
-            detailed_movies_collection = db['detailed_movies']
-            # Clear existing data
-            detailed_movies_collection.delete_many({})
-            # Insert new data
-            detailed_movies_collection.insert_many(detailed_movies)
-            print(f"Imported {len(detailed_movies)} detailed movies")
-    
-    # Import detailed series data
-    if os.path.exists('data/raw_data/detailed_series.json'):
-        print("Importing detailed series data...")
-        with open('data/raw_data/detailed_series.json', 'r', encoding='utf-8') as f:
-            detailed_series = json.load(f)
-        
-        if detailed_series:
-            print(f"Original detailed series count: {len(detailed_series)}")
-            # Remove duplicates
-            detailed_series = remove_duplicates(detailed_series)
-            print(f"Deduplicated detailed series count: {len(detailed_series)}")
-            
-            detailed_series_collection = db['detailed_series']
-            # Clear existing data
-            detailed_series_collection.delete_many({})
-            # Insert new data
-            detailed_series_collection.insert_many(detailed_series)
-            print(f"Imported {len(detailed_series)} detailed series")
-    
-    print("Import complete!")
+    return client['imdb_recommender']
+
+def import_data_to_mongodb(mode='bulk', batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+    """
+    Import all raw data files into MongoDB.
+
+    mode='bulk' streams batched upserts and mode='swap' loads a staging
+    collection and renames it over the live one; both import independent
+    collections in parallel. mode='replace' keeps the original
+    delete-then-insert behaviour.
+
+    Raises RuntimeError if any collection failed. In swap mode nothing goes
+    live unless every collection was staged, so a failed run never leaves a
+    mix of old and new generations.
+    """
+    db = connect()
+    start = time.perf_counter()
+    imported = []
+    failures = []
+
+    if mode in ('bulk', 'swap') and workers > 1:
+        # Collections are independent, so import them side by side
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(import_spec, db, spec, mode, batch_size): spec for spec in IMPORT_SPECS}
+            for future in as_completed(futures):
+                spec = futures[future]
+                try:
+                    imported.extend(future.result())
+                except Exception as e:
+                    print(f"Error importing {spec['label']}: {e}")
+                    failures.append(spec['label'])
+    else:
+        for spec in IMPORT_SPECS:
+            try:
+                imported.extend(import_spec(db, spec, mode, batch_size))
+            except Exception as e:
+                print(f"Error importing {spec['label']}: {e}")
+                failures.append(spec['label'])
+                if mode == 'replace':
+                    # Later collections would be cleared and reloaded against a broken import
+                    break
+
+    if failures:
+        if mode == 'swap':
+            print("Live collections left unchanged; staging collections kept for inspection")
+        raise RuntimeError(f"Import failed for {', '.join(failures)}")
+
+    if mode == 'swap':
+        promote_all(db, imported)
+
+    print(f"Import complete in {time.perf_counter() - start:.2f}s!")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import raw TMDb data into MongoDB")
+    parser.add_argument('--mode', choices=['bulk', 'swap', 'replace'], default='bulk',
+                        help="bulk: batched upserts keyed on id (default); swap: load a staging "
+                             "collection and rename it over the live one; replace: delete then insert")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Documents per bulk_write request")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Collections imported in parallel in bulk and swap modes")
+    parser.add_argument('--rollback', action='store_true',
+                        help="Restore the generation kept by the last swap import and exit")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    import_data_to_mongodb()
\ No newline at end of file
+    args = parse_args()
+    if args.rollback:
+        rollback_import()
+    else:
+        try:
+            import_data_to_mongodb(mode=args.mode, batch_size=args.batch_size, workers=args.workers)
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
@@ -0,0 +1,308 @@
+# src/data/cache.py
+"""
+Read-through cache in front of a storage backend.
+
+CachedStorage wraps any Storage (src/data/storage.py) and keeps the title
+documents and cards it returns, so the titles every home page, landing page
+and recommendation list asks for are fetched from MongoDB once per TTL
+instead of once per request:
+
+- entries are evicted least recently used once the cache holds more than
+  max_bytes (an estimate of the size of the cached documents)
+- every entry has a TTL; unknown ids are remembered for a shorter time
+- concurrent misses for the same id wait for one fetch instead of each
+  making their own, and bulk lookups fetch all their misses in one call
+- stats() reports hits, misses, coalesced waits, evictions and size
+
+With a Redis URL (CACHE_REDIS_URL, any Redis-compatible server), documents
+are also shared between processes through a second tier that is checked
+before the backend. Cached documents are shared; callers must not modify them.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from src.data.normalize import canonical_id
+from src.data.storage import Storage
+from src.logs import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 600
+# Ids no source knows are retried sooner, in case they are being imported
+DEFAULT_NEGATIVE_TTL = 60
+
+REDIS_KEY_PREFIX = 'imdb_recommender:'
+
+_NOT_FOUND = object()
+
+
+def approximate_size(value):
+    """Rough size in bytes of a JSON-like document, without serializing it"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + approximate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += approximate_size(item)
+    return size
+
+
+class RedisTier:
+    """Shared second tier on a Redis-compatible server; errors are logged and treated as misses"""
+
+    def __init__(self, url, ttl=DEFAULT_TTL):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(namespace, title_id):
+        return f'{REDIS_KEY_PREFIX}{namespace}:{title_id}'
+
+    def get_many(self, namespace, ids):
+        try:
+            values = self.client.mget([self._key(namespace, title_id) for title_id in ids])
+        except Exception as e:
+            logger.warning("Error reading the Redis cache: %s", e)
+            return {}
+        return {title_id: json.loads(value) for title_id, value in zip(ids, values) if value is not None}
+
+    def set_many(self, namespace, documents, ttl=None):
+        # default=str so a stray BSON value (ObjectId, datetime) can't stop the whole write
+        if not documents:
+            return
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for title_id, document in documents.items():
+                pipeline.setex(self._key(namespace, title_id), int(ttl or self.ttl), json.dumps(document, default=str))
+            pipeline.execute()
+        except Exception as e:
+            logger.warning("Error writing the Redis cache: %s", e)
+
+
+class CachedStorage(Storage):
+    """Storage backend with a bounded, TTL-based read-through cache in front"""
+
+    def __init__(self, backend, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, redis_url=None):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # (namespace, id) -> (value, expires_at, size), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # (namespace, id) -> Future of the fetch in progress
+        self._inflight = {}
+        self._metrics = dict.fromkeys(('hits', 'misses', 'coalesced', 'second_tier_hits', 'evictions',
+                                       'expirations', 'fetches', 'fetch_errors'), 0)
+        self.second_tier = None
+        if redis_url:
+            try:
+                self.second_tier = RedisTier(redis_url, ttl=ttl)
+            except Exception as e:
+                logger.warning("Redis cache disabled (%s): %s", redis_url, e)
+
+    def __getattr__(self, name):
+        # Anything outside the Storage interface (e.g. Database.db) goes to the backend
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def _get(self, key, now):
+        """Cached value (None for a known-missing id), _NOT_FOUND if absent or expired; caller holds the lock"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _NOT_FOUND
+        value, expires_at, size = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self._bytes -= size
+            self._metrics['expirations'] += 1
+            return _NOT_FOUND
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value, ttl):
+        """Store a value; caller holds the lock"""
+        size = approximate_size(value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._metrics['evictions'] += 1
+
+    def _lookup(self, namespace, ids, fetch_many, ttl=None):
+        """
+        Values for ids (None for unknown ones), keyed by canonical id.
+        fetch_many(ids) returns {id: document} for the ids it found.
+        """
+        ids = list(dict.fromkeys(canonical_id(title_id) for title_id in ids))
+        found = {}
+        waiting = {}
+        claimed = {}
+        now = time.monotonic()
+        with self._lock:
+            for title_id in ids:
+                key = (namespace, title_id)
+                value = self._get(key, now)
+                if value is not _NOT_FOUND:
+                    self._metrics['hits'] += 1
+                    found[title_id] = value
+                elif key in self._inflight:
+                    # Another request is fetching this id right now
+                    self._metrics['coalesced'] += 1
+                    waiting[title_id] = self._inflight[key]
+                else:
+                    self._metrics['misses'] += 1
+                    claimed[title_id] = self._inflight[key] = Future()
+
+        if claimed:
+            self._fetch(namespace, claimed, fetch_many, ttl)
+        for title_id, future in waiting.items():
+            # Raises if the request that fetched it failed, as the backend would have
+            found[title_id] = future.result()
+        for title_id, future in claimed.items():
+            found[title_id] = future.result()
+        return found
+
+    def _fetch(self, namespace, claimed, fetch_many, ttl):
+        ids = list(claimed)
+        fetched = {}
+        error = None
+        second_tier_hits = 0
+        fetches = 0
+        try:
+            if self.second_tier is not None:
+                fetched = self.second_tier.get_many(namespace, ids)
+                second_tier_hits = len(fetched)
+            missing = [title_id for title_id in ids if title_id not in fetched]
+            if missing:
+                fetches = 1
+                from_backend = {canonical_id(title_id): document
+                                for title_id, document in fetch_many(missing).items()}
+                fetched.update(from_backend)
+                if self.second_tier is not None:
+                    self.second_tier.set_many(namespace, from_backend, ttl=ttl)
+        except Exception as e:
+            logger.error("Error fetching %s %s: %s", namespace, ids, e)
+            error = e
+
+        with self._lock:
+            self._metrics['second_tier_hits'] += second_tier_hits
+            self._metrics['fetches'] += fetches
+            self._metrics['fetch_errors'] += error is not None
+            for title_id in ids:
+                del self._inflight[(namespace, title_id)]
+                if error is None:
+                    value = fetched.get(title_id)
+                    self._put((namespace, title_id), value,
+                              (ttl or self.ttl) if value is not None else self.negative_ttl)
+        for title_id, future in claimed.items():
+            if error is None:
+                future.set_result(fetched.get(title_id))
+            else:
+                future.set_exception(error)
+        if error is not None:
+            raise error
+
+    def _lookup_one(self, namespace, title_id, fetch_one, ttl=None):
+        def fetch_many(ids):
+            document = fetch_one(ids[0])
+            return {ids[0]: document} if document is not None else {}
+        return self._lookup(namespace, [title_id], fetch_many, ttl).get(canonical_id(title_id))
+
+    def get_by_id(self, collection_name, title_id, ttl=None):
+        return self._lookup_one(collection_name, title_id,
+                                lambda key: self.backend.get_by_id(collection_name, key), ttl)
+
+    def get_many(self, collection_name, ids, ttl=None):
+        found = self._lookup(collection_name, ids, lambda keys: self.backend.get_many(collection_name, keys), ttl)
+        return {title_id: document for title_id, document in found.items() if document is not None}
+
+    def find(self, collection_name, query=None, projection=None, limit=None):
+        # Queries are not cached; they are rare next to lookups by id
+        return self.backend.find(collection_name, query, projection=projection, limit=limit)
+
+    def get_detailed_movie(self, movie_id, ttl=None):
+        return self._lookup_one('detailed_movies', movie_id, self.backend.get_detailed_movie, ttl)
+
+    def get_detailed_series(self, series_id, ttl=None):
+        return self._lookup_one('detailed_series', series_id, self.backend.get_detailed_series, ttl)
+
+    def get_movie_cards(self, movie_ids, ttl=None):
+        found = self._lookup('movie_cards', movie_ids, self.backend.get_movie_cards, ttl)
+        return {title_id: document for title_id, document in found.items() if document is not None}
+
+    def get_series_cards(self, series_ids, ttl=None):
+        found = self._lookup('series_cards', series_ids, self.backend.get_series_cards, ttl)
+        return {title_id: document for title_id, document in found.items() if document is not None}
+
+    def get_movie_genres(self):
+        return self.backend.get_movie_genres()
+
+    def get_tv_genres(self):
+        return self.backend.get_tv_genres()
+
+    def invalidate(self, namespace, ids=None):
+        """Drop cached entries of a namespace (a collection name), or only the given ids"""
+        with self._lock:
+            if ids is None:
+                keys = [key for key in self._entries if key[0] == namespace]
+            else:
+                keys = [(namespace, canonical_id(title_id)) for title_id in ids]
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Cache metrics since startup"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['max_bytes'] = self.max_bytes
+            stats['inflight'] = len(self._inflight)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['second_tier'] = self.second_tier is not None
+        return stats
+
+
+def cached_storage(backend, config=None):
+    """
+    Wrap a backend according to STORAGE_CACHE_MB (0 disables the cache),
+    STORAGE_CACHE_TTL and CACHE_REDIS_URL
+    """
+    config = config or {}
+
+    def setting(name, default):
+        value = config.get(name)
+        return os.getenv(name, default) if value is None else value
+
+    max_mb = float(setting('STORAGE_CACHE_MB', 64))
+    if max_mb <= 0:
+        return backend
+    return CachedStorage(backend, max_bytes=int(max_mb * 1024 * 1024),
+                         ttl=float(setting('STORAGE_CACHE_TTL', DEFAULT_TTL)),
+                         redis_url=setting('CACHE_REDIS_URL', None))
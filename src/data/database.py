@@ -3,7 +3,13 @@ from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
-class Database:
+from src.data.normalize import canonical_id
+from src.data.storage import Storage
+from src.logs import get_logger
+
+logger = get_logger(__name__)
+
+class Database(Storage):
     _instance = None
     
     def __new__(cls):
@@ -16,16 +22,37 @@ class Database:
             mongo_uri = os.getenv('MONGO_URI')
             
             # Add debug output but don't change functionality
-            print("Connecting to MongoDB...")
+            logger.info("Connecting to MongoDB...")
             
             # Connect to MongoDB
             cls._instance.client = MongoClient(mongo_uri)
             cls._instance.db = cls._instance.client['imdb_recommender']
             
             # Add debug output after connection
-            print("MongoDB connection established")
+            logger.info("MongoDB connection established")
         return cls._instance
     
+    def get_by_id(self, collection_name, title_id):
+        """The first document of a collection with this id, or None"""
+        return self.db[collection_name].find_one({"id": canonical_id(title_id)}, {"_id": 0})
+    
+    def get_many(self, collection_name, ids):
+        """Documents for several ids in one query, keyed by id"""
+        ids = [canonical_id(title_id) for title_id in ids]
+        found = {}
+        for doc in self.db[collection_name].find({"id": {"$in": ids}}, {"_id": 0}):
+            found.setdefault(doc["id"], doc)
+        return found
+    
+    def find(self, collection_name, query=None, projection=None, limit=None):
+        """Documents matching a query; the projection never includes _id"""
+        projection = dict(projection or {})
+        projection["_id"] = 0
+        cursor = self.db[collection_name].find(query or {}, projection)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+    
     # Rest of your class remains unchanged
     def get_movies(self, query=None, limit=None):
         """Get movies from database with optional filtering"""
@@ -58,19 +85,3 @@ class Database:
     def get_series_by_id(self, series_id):
         """Get a TV series by its ID"""
         return self.db.series.find_one({"id": series_id})
-    
-    def get_detailed_movie(self, movie_id):
-        """Get detailed movie information by ID"""
-        return self.db.detailed_movies.find_one({"id": movie_id})
-    
-    def get_detailed_series(self, series_id):
-        """Get detailed series information by ID"""
-        return self.db.detailed_series.find_one({"id": series_id})
-    
-    def get_movie_genres(self):
-        """Get all movie genres"""
-        return list(self.db.movie_genres.find())
-    
-    def get_tv_genres(self):
-        """Get all TV genres"""
-        return list(self.db.tv_genres.find())
\ No newline at end of file
@@ -0,0 +1,200 @@
+# src/data/details.py
+"""
+Detail resolution for the movie and series pages and the recommendation APIs.
+
+A DetailResolver belongs to one loaded model. resolve(title_id) finds a
+title with exactly one indexed lookup per source: a binary search over the
+model's sorted ids, and a get by canonical id from the storage backend. It merges
+the two, normalizing only documents that weren't prepared at import time
+(src/data/normalize.py). Stored documents are cached by the storage layer
+(src/data/cache.py), under its size limit and STORAGE_CACHE_TTL, so a title
+that appears on many pages as a recommendation is fetched once per TTL.
+
+detail(title_id) runs the main lookup and the enrichment of every
+recommendation concurrently on a shared thread pool. The lookups run in the
+request's context, so their model_lookup, storage_lookup and normalize spans
+count towards the request's Server-Timing (src/instrumentation.py).
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.data.normalize import canonical_id, is_normalized, normalize_document
+from src.instrumentation import span
+from src.logs import get_logger
+
+logger = get_logger(__name__)
+
+# Lookups made on behalf of a request run on this pool, so a detail page waits
+# for its slowest lookup instead of the sum of all of them. Threads start on
+# first submit, i.e. in the worker after a preload fork.
+ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', '16'))
+_enrichment_pool = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix='enrich')
+
+DETAIL_CONFIGS = {
+    'movie': {
+        'df_key': 'movies_df',
+        'title_field': 'title',
+        'fetch': 'get_detailed_movie',
+        'recommend': 'get_movie_recommendations_by_id',
+    },
+    'series': {
+        'df_key': 'series_df',
+        'title_field': 'name',
+        'fetch': 'get_detailed_series',
+        'recommend': 'get_series_recommendations_by_id',
+    },
+}
+
+
+def _plain(value):
+    """NumPy scalars and missing Arrow values from the dataframe as plain Python values"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return None if value is pd.NA else value
+
+
+def _column_values(series):
+    """The array behind a dataframe column: a NumPy array, or the Arrow-backed extension array"""
+    return series.array if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) else series.to_numpy()
+
+
+class DetailResolver:
+    """Resolves and normalizes title documents for one loaded model"""
+
+    def __init__(self, kind, model, db=None):
+        self.kind = kind
+        self.config = DETAIL_CONFIGS[kind]
+        self.model = model
+        self.df = model[self.config['df_key']]
+        # db may be a Storage backend or a callable returning one (or None while unavailable)
+        self._get_db = db if callable(db) else (lambda: db)
+
+        # Rows are read straight from the column arrays, and ids are found by
+        # binary search over sorted NumPy arrays: no per-title Python objects
+        # are built for (or touched by) a lookup, so preforked workers keep
+        # sharing the model's pages. A stable sort keeps the first row of a duplicate id.
+        self._columns = [(column, _column_values(self.df[column])) for column in self.df.columns]
+        ids = pd.to_numeric(self.df['id'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+        self._order = np.argsort(ids, kind='stable')
+        self._sorted_ids = ids[self._order]
+
+    def position(self, key):
+        """Row position of a canonical id in the model dataframe, or None"""
+        # Missing ids are stored as -1; anything outside int64 can't be in the array
+        if isinstance(key, bool) or not isinstance(key, int) or not 0 <= key < 2 ** 63:
+            return None
+        i = int(np.searchsorted(self._sorted_ids, key))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == key:
+            return int(self._order[i])
+        return None
+
+    def model_row(self, key):
+        """The model dataframe row for a canonical id, as a dict, or None"""
+        position = self.position(key)
+        if position is None:
+            return None
+        return {column: _plain(values[position]) for column, values in self._columns}
+
+    def fetch(self, key):
+        """The stored document for a canonical id, or None"""
+        db = self._get_db()
+        if db is None:
+            return None
+        try:
+            return getattr(db, self.config['fetch'])(key)
+        except Exception as e:
+            logger.error("Error fetching %s %s from storage: %s", self.kind, key, e)
+            return None
+
+    def normalize(self, document, row):
+        """
+        One document from the stored document and/or the model row. Storage
+        supplies the details; the model keeps its id, title and genres.
+        """
+        title_field = self.config['title_field']
+        if document and is_normalized(document):
+            # Already in the stored shape (see src/data/normalize.py); '_id' is not JSON-serializable
+            normalized = {field: value for field, value in document.items() if field != '_id'}
+        else:
+            normalized = normalize_document(document or row, self.kind)
+
+        if document and row:
+            normalized[title_field] = row[title_field]
+            normalized['id'] = canonical_id(row['id'])
+            if not normalized['genre_names'] and isinstance(row.get('genre_names'), list):
+                normalized['genre_names'] = row['genre_names']
+        return normalized
+
+    def resolve(self, title_id):
+        """
+        Normalized document for a title, or None if no source knows it.
+        A new dict on every call; the stored document it was made from may be
+        shared through the storage cache.
+        """
+        key = canonical_id(title_id)
+        with span('model_lookup'):
+            row = self.model_row(key)
+        with span('storage_lookup'):
+            found = self.fetch(key)
+        if row is None and not found:
+            return None
+        with span('normalize'):
+            return self.normalize(found, row)
+
+    def _submit(self, key):
+        """resolve(key) on the enrichment pool, in a copy of the caller's context (and request trace)"""
+        return _enrichment_pool.submit(contextvars.copy_context().run, self.resolve, key)
+
+    def recommend(self, key, top_n=9):
+        """Hybrid recommendations for a title in the model"""
+        from src.models import content_based
+        return getattr(content_based, self.config['recommend'])(key, self.model, top_n=top_n)
+
+    def in_model(self, title_id):
+        """Whether the model knows a title, i.e. can recommend for it"""
+        return self.position(canonical_id(title_id)) is not None
+
+    @staticmethod
+    def merge_recommendation(rec, document):
+        """
+        A recommendation with its resolved details. The document only fills
+        fields the recommendation lacks (or has as None), so the model's
+        fields and scores win.
+        """
+        if not document:
+            return rec
+        merged = dict(rec)
+        for field, value in document.items():
+            if field in ('_id', 'normalized'):
+                continue
+            if merged.get(field) is None:
+                merged[field] = value
+        return merged
+
+    def detail(self, title_id, top_n=9):
+        """
+        (document, recommendations) for a detail page. The main lookup and
+        the enrichment of every recommendation run concurrently. document is
+        None if the title is unknown.
+        """
+        key = canonical_id(title_id)
+
+        main = self._submit(key)
+
+        recommendations = []
+        if self.in_model(key):
+            try:
+                recommendations = self.recommend(key, top_n=top_n)
+            except Exception as e:
+                logger.error("Error getting %s recommendations: %s", self.kind, e)
+        futures = [self._submit(rec['id']) for rec in recommendations]
+
+        with span('enrich'):
+            document = main.result()
+            results = [future.result() for future in futures]
+        recommendations = [self.merge_recommendation(rec, result) for rec, result in zip(recommendations, results)]
+        return document, recommendations
@@ -1,8 +1,247 @@
 # src/data/json_database.py
+import gzip
 import json
+import mmap
 import os
+import re
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 
-class JSONDatabase:
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.data.normalize import CARD_COLLECTIONS, canonical_id, card, is_normalized, normalize_document
+from src.data.storage import Storage, apply_projection
+from src.logs import configure_logging, get_logger
+
+logger = get_logger(__name__)
+
+# orjson parses several times faster than json and is optional
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+# Collections loaded from <data_dir>/imdb_recommender.<name><format>, with the label used in logs
+COLLECTIONS = {
+    'detailed_movies': 'detailed movies',
+    'detailed_series': 'detailed series',
+    'movie_genres': 'movie genres',
+    'tv_genres': 'TV genres',
+    'movies': 'movies',
+    'series': 'series',
+}
+FILE_PREFIX = 'imdb_recommender.'
+
+# File formats tried for each collection, in order. JSON Lines has one document
+# per line, which is what lets lazy mode index a file without decoding it.
+FILE_FORMATS = ('.jsonl', '.jsonl.gz', '.json.gz', '.json')
+
+# Detailed collections and the kind their documents are normalized as
+DETAILED_KINDS = {
+    'detailed_movies': 'movie',
+    'detailed_series': 'series',
+}
+
+# Secondary hash indexes built at load time, in addition to 'id' on every
+# collection. More can be added at runtime with JSONDatabase.create_index().
+SECONDARY_INDEXES = {
+    'detailed_movies': ('original_language',),
+    'detailed_series': ('original_language',),
+    'movies': ('genre_ids', 'original_language'),
+    'series': ('genre_ids', 'original_language'),
+}
+
+# Query operators understood by find(); the range ones compare with < and >
+RANGE_OPERATORS = {
+    '$gt': lambda value, bound: value > bound,
+    '$gte': lambda value, bound: value >= bound,
+    '$lt': lambda value, bound: value < bound,
+    '$lte': lambda value, bound: value <= bound,
+}
+QUERY_OPERATORS = {'$eq', '$ne', '$in', '$nin', *RANGE_OPERATORS}
+
+_MISSING = object()
+
+# Lines written by `convert` start with the id, so lazy mode can read it without decoding
+_LEADING_ID = re.compile(rb'^\s*\{\s*"id"\s*:\s*(-?\d+)\s*[,}]')
+
+
+def collection_path(data_dir, name):
+    """Path of the first available format of a collection, or None"""
+    for extension in FILE_FORMATS:
+        path = os.path.join(data_dir, FILE_PREFIX + name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_documents(path):
+    """All documents of a .json/.jsonl file, optionally gzipped"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        if '.jsonl' in path:
+            return [_loads(line) for line in f if line.strip()]
+        return _loads(f.read())
+
+
+def is_operator_query(condition):
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith('$') for key in condition)
+
+
+def _equals(value, expected):
+    """
+    Equality as MongoDB applies it: a list field also matches one of its
+    elements, and null matches a field that is missing as well as a null one
+    """
+    if value is _MISSING:
+        return expected is None
+    if value == expected:
+        return True
+    return isinstance(value, list) and not isinstance(expected, list) and expected in value
+
+
+def _compare(value, operator, bound):
+    values = value if isinstance(value, list) else [value]
+    for item in values:
+        try:
+            if RANGE_OPERATORS[operator](item, bound):
+                return True
+        except TypeError:
+            # Values of other types never match a range, as in MongoDB
+            continue
+    return False
+
+
+def _matches_condition(value, condition):
+    if not is_operator_query(condition):
+        return _equals(value, condition)
+    for operator, operand in condition.items():
+        if operator not in QUERY_OPERATORS:
+            raise ValueError(f"Unsupported query operator: {operator}")
+        if operator == '$eq':
+            matched = _equals(value, operand)
+        elif operator == '$ne':
+            matched = not _equals(value, operand)
+        elif operator == '$in':
+            matched = any(_equals(value, option) for option in operand)
+        elif operator == '$nin':
+            matched = not any(_equals(value, option) for option in operand)
+        else:
+            matched = value is not _MISSING and _compare(value, operator, operand)
+        if not matched:
+            return False
+    return True
+
+
+def matches(document, query):
+    """True if a document satisfies every field condition of a query"""
+    return all(_matches_condition(document.get(field, _MISSING), condition)
+               for field, condition in query.items())
+
+
+def index_keys(value):
+    """Hash index keys of a field value; list values are indexed by element"""
+    values = value if isinstance(value, list) else [value]
+    keys = []
+    for item in values:
+        try:
+            hash(item)
+        except TypeError:
+            continue
+        keys.append(item)
+    return keys
+
+
+def _index_lookup(index, condition):
+    """
+    Positions that may satisfy a condition, from a hash index on its field, or
+    None if the index can't narrow the condition ($ne, $nin, whole-list
+    equality, and null, which also matches documents missing the field and
+    so isn't in the index).
+    """
+    if not is_operator_query(condition):
+        condition = {'$eq': condition}
+    positions = None
+    for operator, operand in condition.items():
+        if operator == '$eq':
+            keys = index_keys(operand) if not isinstance(operand, (list, dict, type(None))) else None
+        elif operator == '$in':
+            keys = [key for option in operand if not isinstance(option, (list, dict, type(None)))
+                    for key in index_keys(option)]
+            if len(keys) != len(operand):
+                keys = None
+        elif operator in RANGE_OPERATORS:
+            # Hash indexes have no order; the range is checked against each distinct value
+            keys = [key for key in index if _compare(key, operator, operand)]
+        else:
+            keys = None
+        if keys is None:
+            continue
+        found = set()
+        for key in keys:
+            found.update(index.get(key, ()))
+        positions = found if positions is None else positions & found
+    return positions
+
+
+class LazyCollection:
+    """
+    Read-only sequence over an uncompressed JSON Lines file. Only the byte
+    offset and id of each line stay in memory; a document is decoded (and
+    normalized) each time it is accessed, so open_storage puts a lazy
+    JSONDatabase behind the read-through cache (src/data/cache.py).
+    """
+
+    def __init__(self, path, kind=None):
+        self.path = path
+        self.kind = kind
+        self.offsets = array('q')
+        self.ids = []
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._scan()
+
+    def _scan(self):
+        position = 0
+        end = len(self._map)
+        while position < end:
+            newline = self._map.find(b'\n', position)
+            stop = end if newline == -1 else newline + 1
+            line = self._map[position:stop]
+            if line.strip():
+                match = _LEADING_ID.match(line)
+                title_id = int(match.group(1)) if match else _loads(line).get('id')
+                self.offsets.append(position)
+                self.ids.append(canonical_id(title_id) if title_id is not None else None)
+            position = stop
+        self.offsets.append(end)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        document = _loads(self._map[self.offsets[position]:self.offsets[position + 1]])
+        if not is_normalized(document):
+            document = normalize_document(document, self.kind)
+        return document
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+class JSONDatabase(Storage):
     """
     Database class that uses JSON files instead of MongoDB
     Implements a singleton pattern to avoid reloading data on every request
@@ -10,165 +249,193 @@ class JSONDatabase:
     _instance = None  # Class variable to hold the singleton instance
     _is_initialized = False  # Flag to check if data has been loaded
     
-    def __new__(cls, data_dir="data/processed"):
+    def __new__(cls, data_dir="data/processed", lazy=None):
         # Create a singleton instance
         if cls._instance is None:
             cls._instance = super(JSONDatabase, cls).__new__(cls)
             cls._instance.data_dir = data_dir
             cls._instance.collections = {}
+            cls._instance.field_indexes = {}
             cls._instance._is_initialized = False
         return cls._instance
     
-    def __init__(self, data_dir="data/processed"):
+    def __init__(self, data_dir="data/processed", lazy=None):
         # Only initialize data once, even if __init__ is called multiple times
         if not self._is_initialized:
             self.data_dir = data_dir
+            # Lazy mode keeps only an id -> offset index for .jsonl files
+            self.lazy = os.getenv('JSONDB_LAZY', '0') == '1' if lazy is None else lazy
             self._load_collections()
             self._is_initialized = True
     
+    def _load_collection(self, name):
+        path = collection_path(self.data_dir, name)
+        if path is None:
+            return None
+        if self.lazy and path.endswith('.jsonl'):
+            return LazyCollection(path, DETAILED_KINDS.get(name))
+        return read_documents(path)
+    
     def _load_collections(self):
-        """Load all JSON files from data directory"""
+        """Load all collection files from the data directory, in parallel"""
         try:
-            print(f"Looking for JSON files in: {self.data_dir}")
+            logger.info("Looking for JSON files in: %s", self.data_dir)
             if not os.path.exists(self.data_dir):
-                print(f"Data directory does not exist: {self.data_dir}")
+                logger.info("Data directory does not exist: %s", self.data_dir)
                 os.makedirs(self.data_dir, exist_ok=True)
-                print(f"Created data directory: {self.data_dir}")
-            # Load detailed movies
-            movies_path = os.path.join(self.data_dir, "imdb_recommender.detailed_movies.json")
-            if os.path.exists(movies_path):
-                with open(movies_path, 'r', encoding='utf-8') as f:
-                    self.collections["detailed_movies"] = json.load(f)
-                print(f"Loaded {len(self.collections['detailed_movies'])} detailed movies")
-            
-            # Load detailed series
-            series_path = os.path.join(self.data_dir, "imdb_recommender.detailed_series.json")
-            if os.path.exists(series_path):
-                with open(series_path, 'r', encoding='utf-8') as f:
-                    self.collections["detailed_series"] = json.load(f)
-                print(f"Loaded {len(self.collections['detailed_series'])} detailed series")
-            
-            # Load movie genres
-            movie_genres_path = os.path.join(self.data_dir, "imdb_recommender.movie_genres.json")
-            if os.path.exists(movie_genres_path):
-                with open(movie_genres_path, 'r', encoding='utf-8') as f:
-                    self.collections["movie_genres"] = json.load(f)
-                print(f"Loaded {len(self.collections['movie_genres'])} movie genres")
+                logger.info("Created data directory: %s", self.data_dir)
             
-            # Load TV genres
-            tv_genres_path = os.path.join(self.data_dir, "imdb_recommender.tv_genres.json")
-            if os.path.exists(tv_genres_path):
-                with open(tv_genres_path, 'r', encoding='utf-8') as f:
-                    self.collections["tv_genres"] = json.load(f)
-                print(f"Loaded {len(self.collections['tv_genres'])} TV genres")
+            start = time.perf_counter()
+            names = list(COLLECTIONS)
+            # Decompression and file reads release the GIL, so collections load side by side
+            with ThreadPoolExecutor(max_workers=len(names)) as executor:
+                loaded = list(executor.map(self._load_collection, names))
+            for name, documents in zip(names, loaded):
+                if documents is not None:
+                    self.collections[name] = documents
+                    mode = ' (lazy)' if isinstance(documents, LazyCollection) else ''
+                    logger.info("Loaded %s %s%s", len(documents), COLLECTIONS[name], mode)
+            logger.info("Loaded collections in %.2fs", time.perf_counter() - start,
+                        extra={'parser': 'orjson' if orjson else 'json'})
             
-            # Load other collections if needed
-            movies_path = os.path.join(self.data_dir, "imdb_recommender.movies.json")
-            if os.path.exists(movies_path):
-                with open(movies_path, 'r', encoding='utf-8') as f:
-                    self.collections["movies"] = json.load(f)
-                print(f"Loaded {len(self.collections['movies'])} movies")
-                
-            series_path = os.path.join(self.data_dir, "imdb_recommender.series.json")
-            if os.path.exists(series_path):
-                with open(series_path, 'r', encoding='utf-8') as f:
-                    self.collections["series"] = json.load(f)
-                print(f"Loaded {len(self.collections['series'])} series")
+            # Same document shape as the MongoDB import; exports from it are already normalized
+            self._normalize_collections()
                 
             # Create an ID-based index for faster lookups
             self._create_indexes()
                 
         except Exception as e:
-            print(f"Error loading collections: {e}")
+            logger.error("Error loading collections: %s", e)
+    
+    def _normalize_collections(self):
+        """Normalize loaded documents once and build the card collections"""
+        for name, documents in list(self.collections.items()):
+            # Lazy collections normalize each document as it is decoded
+            if isinstance(documents, LazyCollection):
+                continue
+            kind = DETAILED_KINDS.get(name)
+            if not all(is_normalized(document) for document in documents):
+                self.collections[name] = [normalize_document(document, kind) for document in documents]
+        for name, kind in DETAILED_KINDS.items():
+            if name in self.collections and not isinstance(self.collections[name], LazyCollection):
+                self.collections[CARD_COLLECTIONS[kind]] = [card(document, kind) for document in self.collections[name]]
     
     def _create_indexes(self):
-        """Create indexes for faster lookups by ID"""
-        self.indexes = {}
-        
-        # Create index for detailed movies
-        if "detailed_movies" in self.collections:
-            self.indexes["detailed_movies"] = {}
-            for i, movie in enumerate(self.collections["detailed_movies"]):
-                if "id" in movie:
-                    # Convert ID to string for consistent lookup
-                    movie_id = str(movie["id"])
-                    self.indexes["detailed_movies"][movie_id] = i
-        
-        # Create index for detailed series
-        if "detailed_series" in self.collections:
-            self.indexes["detailed_series"] = {}
-            for i, series in enumerate(self.collections["detailed_series"]):
-                if "id" in series:
-                    # Convert ID to string for consistent lookup
-                    series_id = str(series["id"])
-                    self.indexes["detailed_series"][series_id] = i
+        """Create hash indexes for faster lookups by id and the secondary fields"""
+        # collection -> field -> value -> positions; the first position is what get_by_id returns
+        self.field_indexes = {}
+        for name in self.collections:
+            self.create_index(name, 'id')
+            for field in SECONDARY_INDEXES.get(name, ()):
+                self.create_index(name, field)
+    
+    def create_index(self, collection_name, field):
+        """
+        Build a hash index on a field of a collection, used by find() for
+        equality, $in and range conditions on that field. Lazy collections are
+        only indexed on 'id', which is known without decoding the documents.
+        """
+        documents = self.collections.get(collection_name)
+        if documents is None:
+            return False
+        if isinstance(documents, LazyCollection):
+            if field != 'id':
+                return False
+            values = documents.ids
+        else:
+            values = [document.get(field, _MISSING) for document in documents]
+
+        index = {}
+        for position, value in enumerate(values):
+            if value is _MISSING or value is None:
+                continue
+            for key in index_keys(value):
+                positions = index.setdefault(key, [])
+                # A list with a repeated element is indexed once
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+        self.field_indexes.setdefault(collection_name, {})[field] = index
+        return True
+    
+    def _plan(self, collection_name, query):
+        """(indexed fields used, candidate positions or None for a full scan)"""
+        indexes = self.field_indexes.get(collection_name, {})
+        used = []
+        candidates = None
+        for field, condition in query.items():
+            if field not in indexes:
+                continue
+            positions = _index_lookup(indexes[field], condition)
+            if positions is None:
+                continue
+            used.append(field)
+            candidates = positions if candidates is None else candidates & positions
+        return used, candidates
+    
+    def explain(self, collection_name, query):
+        """How find() would run a query: the indexes it uses and how many documents it checks"""
+        used, candidates = self._plan(collection_name, query or {})
+        total = len(self.get_collection(collection_name))
+        return {
+            'collection': collection_name,
+            'plan': 'index' if used else 'scan',
+            'indexes': used,
+            'documents_examined': total if candidates is None else len(candidates),
+            'collection_size': total,
+        }
     
     def get_collection(self, collection_name):
         """Get a collection by name"""
         return self.collections.get(collection_name, [])
     
-    def get_detailed_movie(self, movie_id):
-        """Get detailed movie by ID - using index for faster lookup"""
-        # Convert ID to string for consistent comparison
-        movie_id_str = str(movie_id)
-        
-        # Check if we have an index for this collection
-        if "detailed_movies" in self.indexes and movie_id_str in self.indexes["detailed_movies"]:
-            # Get the movie directly from the index
-            idx = self.indexes["detailed_movies"][movie_id_str]
-            return self.collections["detailed_movies"][idx]
-        
-        # Fallback to linear search if not found in index
-        movies = self.collections.get("detailed_movies", [])
-        for movie in movies:
-            if str(movie.get("id", "")) == movie_id_str:
-                return movie
-        
-        return None
+    def get_by_id(self, collection_name, title_id):
+        """The first document of a collection with this id, or None"""
+        positions = self.field_indexes.get(collection_name, {}).get('id', {}).get(canonical_id(title_id))
+        return self.collections[collection_name][positions[0]] if positions else None
     
-    def get_detailed_series(self, series_id):
-        """Get detailed series by ID - using index for faster lookup"""
-        # Convert ID to string for consistent comparison
-        series_id_str = str(series_id)
-        
-        # Check if we have an index for this collection
-        if "detailed_series" in self.indexes and series_id_str in self.indexes["detailed_series"]:
-            # Get the series directly from the index
-            idx = self.indexes["detailed_series"][series_id_str]
-            return self.collections["detailed_series"][idx]
-        
-        # Fallback to linear search if not found in index
-        series_list = self.collections.get("detailed_series", [])
-        for series in series_list:
-            if str(series.get("id", "")) == series_id_str:
-                return series
-        
-        return None
+    def get_many(self, collection_name, ids):
+        """Documents for several ids, keyed by id"""
+        index = self.field_indexes.get(collection_name, {}).get('id', {})
+        documents = self.collections.get(collection_name, [])
+        found = {}
+        for title_id in ids:
+            positions = index.get(canonical_id(title_id))
+            if positions:
+                document = documents[positions[0]]
+                found[document['id']] = document
+        return found
     
-    def find(self, collection_name, query=None, limit=None):
-        """Simplified find method similar to MongoDB"""
+    def find(self, collection_name, query=None, projection=None, limit=None):
+        """
+        Simplified find method similar to MongoDB. Conditions are equality
+        (a list field matches any of its elements), or operators $eq, $ne, $in,
+        $nin, $gt, $gte, $lt and $lte. Indexed fields narrow the documents
+        checked; results keep collection order.
+        """
         data = self.get_collection(collection_name)
         
-        if query is None:
+        if not query:
             results = data
-        else:
-            results = []
-            for item in data:
-                match = True
-                for key, value in query.items():
-                    if key not in item or item[key] != value:
-                        match = False
-                        break
-                if match:
-                    results.append(item)
+            if limit and limit > 0:
+                results = results[:limit]
+            if projection:
+                results = [apply_projection(item, projection) for item in results]
+            return results
         
-        if limit and limit > 0:
-            return results[:limit]
+        _, candidates = self._plan(collection_name, query)
+        positions = range(len(data)) if candidates is None else sorted(candidates)
+        results = []
+        for position in positions:
+            item = data[position]
+            if matches(item, query):
+                results.append(apply_projection(item, projection))
+                if limit and 0 < limit <= len(results):
+                    break
         return results
     
-    def find_one(self, collection_name, query):
+    def find_one(self, collection_name, query, projection=None):
         """Find a single document"""
-        results = self.find(collection_name, query, limit=1)
+        results = self.find(collection_name, query, projection=projection, limit=1)
         if results:
             return results[0]
         return None
@@ -177,5 +444,60 @@ class JSONDatabase:
         """Reset the database (useful for testing)"""
         self._is_initialized = False
         self.collections = {}
-        self.indexes = {}
-        self._load_collections()
\ No newline at end of file
+        self.field_indexes = {}
+        self._load_collections()
+
+
+def convert(data_dir, compress=False):
+    """
+    Rewrite every collection of a data directory as JSON Lines (one normalized
+    document per line, id first). Uncompressed output can be loaded lazily.
+    """
+    extension = '.jsonl.gz' if compress else '.jsonl'
+    for name in COLLECTIONS:
+        path = collection_path(data_dir, name)
+        if path is None:
+            continue
+        documents = [normalize_document(document, DETAILED_KINDS.get(name)) for document in read_documents(path)]
+        output = os.path.join(data_dir, FILE_PREFIX + name + extension)
+        tmp_path = output + '.tmp'
+        opener = gzip.open if compress else open
+        with opener(tmp_path, 'wb') as f:
+            for document in documents:
+                document = {'id': document.get('id'), **document}
+                f.write(orjson.dumps(document) if orjson else json.dumps(document, ensure_ascii=False).encode('utf-8'))
+                f.write(b'\n')
+        os.replace(tmp_path, output)
+        print(f"Wrote {len(documents)} {COLLECTIONS[name]} to {output}")
+
+
+def main(argv=None):
+    import argparse
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="Convert and measure the JSON database files")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert', help="Rewrite the collections as JSON Lines")
+    convert_parser.add_argument('--data-dir', default='data/processed')
+    convert_parser.add_argument('--gzip', action='store_true', help="Write .jsonl.gz (not loadable lazily)")
+    stats_parser = subparsers.add_parser('stats', help="Time a load and measure the memory it allocates")
+    stats_parser.add_argument('--data-dir', default='data/processed')
+    stats_parser.add_argument('--lazy', action='store_true')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    if args.command == 'convert':
+        convert(args.data_dir, compress=args.gzip)
+        return
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    JSONDatabase(args.data_dir, lazy=args.lazy)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"Load: {elapsed:.2f}s, resident Python objects: {current / (1024 * 1024):.1f} MB "
+          f"(peak {peak / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# src/data/normalize.py
+"""
+Document normalization shared by the import pipeline and the read path.
+
+mongodb_import.py and JSONDatabase store documents in this shape, so the
+web app reads them as they are:
+
+- 'id' is the canonical integer TMDb id and there is no '_id'
+- detailed documents carry 'genre_names' and a value for every field the
+  templates read (DETAIL_DEFAULTS)
+- 'normalized' holds NORMALIZED_VERSION, so readers can tell a prepared
+  document from an old one and normalize the latter themselves
+
+Each detailed collection also gets a compact card collection (CARD_FIELDS)
+for the poster grids on the home, search and landing pages.
+"""
+import numbers
+
+NORMALIZED_VERSION = 1
+
+# Fields the detail templates read, with the value used when a source lacks them
+DETAIL_DEFAULTS = {
+    'movie': {
+        'genre_names': [],
+        'vote_average': 0.0,
+        'popularity': 0.0,
+        'poster_path': None,
+        'overview': '',
+        'release_date': '',
+        'vote_count': 0,
+        'runtime': 0,
+        'budget': 0,
+        'revenue': 0,
+        'backdrop_path': None,
+        'original_language': '',
+        'production_companies': [],
+    },
+    'series': {
+        'genre_names': [],
+        'vote_average': 0.0,
+        'popularity': 0.0,
+        'poster_path': None,
+        'overview': '',
+        'first_air_date': '',
+        'last_air_date': '',
+        'vote_count': 0,
+        'number_of_seasons': 0,
+        'number_of_episodes': 0,
+        'episode_run_time': 0,
+        'backdrop_path': None,
+        'original_language': '',
+        'networks': [],
+        'status': 'Unknown',
+        'type': '',
+    },
+}
+
+# Fields of the compact card documents
+CARD_FIELDS = {
+    'movie': ('id', 'title', 'poster_path', 'vote_average', 'popularity', 'genre_names', 'release_date'),
+    'series': ('id', 'name', 'poster_path', 'vote_average', 'popularity', 'genre_names', 'first_air_date'),
+}
+
+# Card collection built from each detailed collection
+CARD_COLLECTIONS = {
+    'movie': 'movie_cards',
+    'series': 'series_cards',
+}
+
+
+def canonical_id(title_id):
+    """TMDb ids are integers; URL ids and some stored ids arrive as strings or floats"""
+    if isinstance(title_id, bool):
+        return title_id
+    if isinstance(title_id, numbers.Integral):
+        return int(title_id)
+    if isinstance(title_id, numbers.Real) and float(title_id).is_integer():
+        return int(title_id)
+    title_id = str(title_id)
+    return int(title_id) if title_id.isdigit() else title_id
+
+
+def genre_names(genres):
+    """Names from a TMDb 'genres' list of {'id', 'name'} dicts or plain strings"""
+    if not isinstance(genres, list):
+        return []
+    names = []
+    for genre in genres:
+        if isinstance(genre, dict) and 'name' in genre:
+            names.append(genre['name'])
+        elif isinstance(genre, str):
+            names.append(genre)
+    return names
+
+
+def is_normalized(document):
+    return document.get('normalized') == NORMALIZED_VERSION
+
+
+def normalize_document(document, kind=None):
+    """
+    Copy of a document in the stored shape. kind ('movie' or 'series') marks a
+    detailed document, which also gets genre_names and the template defaults.
+    """
+    normalized = dict(document)
+    normalized.pop('_id', None)
+    if 'id' in normalized and normalized['id'] is not None:
+        normalized['id'] = canonical_id(normalized['id'])
+
+    if kind is not None:
+        if not isinstance(normalized.get('genre_names'), list) or not normalized['genre_names']:
+            normalized['genre_names'] = genre_names(normalized.get('genres'))
+        for field, default in DETAIL_DEFAULTS[kind].items():
+            if normalized.get(field) is None:
+                normalized[field] = list(default) if isinstance(default, list) else default
+
+    normalized['normalized'] = NORMALIZED_VERSION
+    return normalized
+
+
+def card(document, kind):
+    """Compact card projection of a normalized detailed document"""
+    return {field: document.get(field) for field in CARD_FIELDS[kind]}
@@ -0,0 +1,294 @@
+# src/data/sqlite_database.py
+"""
+Embedded SQLite storage backend (STORAGE_BACKEND=sqlite).
+
+The database is built from the JSON exports that JSONDatabase reads:
+
+    python -m src.data.sqlite_database build --data-dir data/processed
+
+Each collection is a table of (position, id, doc) rows, where doc is the
+normalized document as JSON, indexed on id. The fields in SECONDARY_INDEXES
+get a side table <collection>__<field> of (value, doc position) rows, with
+list fields stored one row per element, so equality, $in and range
+conditions on them are answered by an index. The rest of a query is checked
+in Python with the same matcher as JSONDatabase, so both backends return the
+same results.
+
+The file is opened read-only in WAL mode, with one connection per thread
+(and per process after a fork).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.data.json_database import (COLLECTIONS, DETAILED_KINDS, SECONDARY_INDEXES, collection_path, index_keys,
+                                    is_operator_query, matches, read_documents)
+from src.data.normalize import CARD_COLLECTIONS, canonical_id, card, normalize_document
+from src.data.storage import Storage, apply_projection
+from src.logs import get_logger
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+logger = get_logger(__name__)
+
+DEFAULT_PATH = os.path.join('data', 'processed', 'imdb_recommender.sqlite')
+
+# Read connections map the file instead of copying pages into the page cache
+MMAP_SIZE = 256 * 1024 * 1024
+
+INDEX_SEPARATOR = '__'
+
+_SQL_OPERATORS = {'$eq': '=', '$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+
+def _dumps(document):
+    if orjson:
+        return orjson.dumps(document).decode('utf-8')
+    return json.dumps(document, ensure_ascii=False)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _is_scalar(value):
+    return value is not None and not isinstance(value, (list, dict))
+
+
+def _sql_condition(column, condition):
+    """
+    (sql, params) narrowing a condition on an indexed column, or None if the
+    index can't help. Like the JSON planner, the result may include documents
+    that don't match; matches() makes the final decision.
+    """
+    if not is_operator_query(condition):
+        condition = {'$eq': condition}
+    clauses = []
+    params = []
+    for operator, operand in condition.items():
+        if operator in _SQL_OPERATORS and _is_scalar(operand):
+            clauses.append(f'{column} {_SQL_OPERATORS[operator]} ?')
+            params.append(operand)
+        elif operator == '$in' and all(_is_scalar(option) for option in operand):
+            clauses.append(f'{column} IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(list(operand)))
+    if not clauses:
+        return None
+    return ' AND '.join(clauses), params
+
+
+def _write_collection(connection, name, documents):
+    table = _quote(name)
+    connection.execute(f'DROP TABLE IF EXISTS {table}')
+    connection.execute(f'CREATE TABLE {table} (position INTEGER PRIMARY KEY, id, doc TEXT NOT NULL)')
+    connection.executemany(f'INSERT INTO {table} VALUES (?, ?, ?)',
+                           ((position, document.get('id'), _dumps(document))
+                            for position, document in enumerate(documents)))
+    connection.execute(f'CREATE INDEX {_quote(name + "_id")} ON {table} (id)')
+
+    for field in SECONDARY_INDEXES.get(name, ()):
+        side_table = _quote(name + INDEX_SEPARATOR + field)
+        connection.execute(f'DROP TABLE IF EXISTS {side_table}')
+        # No declared type, so values keep their JSON type and compare like they do in Python
+        connection.execute(f'CREATE TABLE {side_table} (value, doc INTEGER NOT NULL)')
+        connection.executemany(f'INSERT INTO {side_table} VALUES (?, ?)',
+                               ((key, position)
+                                for position, document in enumerate(documents)
+                                if document.get(field) is not None
+                                for key in dict.fromkeys(index_keys(document[field]))
+                                if _is_scalar(key)))
+        connection.execute(f'CREATE INDEX {_quote(name + INDEX_SEPARATOR + field + "_value")} '
+                           f'ON {side_table} (value, doc)')
+
+
+def build(data_dir, path=DEFAULT_PATH):
+    """Build the SQLite database from the JSON exports of a data directory"""
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        for name in COLLECTIONS:
+            source = collection_path(data_dir, name)
+            if source is None:
+                continue
+            kind = DETAILED_KINDS.get(name)
+            documents = [normalize_document(document, kind) for document in read_documents(source)]
+            _write_collection(connection, name, documents)
+            print(f"Wrote {len(documents)} {COLLECTIONS[name]}")
+            if kind:
+                _write_collection(connection, CARD_COLLECTIONS[kind], [card(document, kind) for document in documents])
+        connection.commit()
+        connection.execute('ANALYZE')
+        # WAL is stored in the file, so every reader opens it in WAL mode
+        connection.execute('PRAGMA journal_mode=WAL')
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    print(f"Built {path} in {time.perf_counter() - start:.2f}s")
+    return path
+
+
+class SQLiteDatabase(Storage):
+    """
+    Read-only storage over a database built by build(). Implements a
+    singleton pattern like the other backends.
+    """
+    _instance = None
+
+    def __new__(cls, path=None):
+        if cls._instance is None:
+            instance = super(SQLiteDatabase, cls).__new__(cls)
+            instance.path = path or os.getenv('SQLITE_PATH', DEFAULT_PATH)
+            if not os.path.exists(instance.path):
+                raise FileNotFoundError(f"SQLite database not found at {instance.path}; "
+                                        f"build it with python -m src.data.sqlite_database build")
+            instance._local = threading.local()
+            instance._tables = None
+            instance._indexed_fields = None
+            # A forked worker opens its own connections instead of sharing the parent's
+            os.register_at_fork(after_in_child=instance._reset_connections)
+            logger.info("Opened SQLite database %s", instance.path)
+            cls._instance = instance
+        return cls._instance
+
+    def _reset_connections(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            connection.execute('PRAGMA query_only = 1')
+            connection.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+            self._local.connection = connection
+            if self._tables is None:
+                self._load_schema(connection)
+        return connection
+
+    def _load_schema(self, connection):
+        names = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        indexed_fields = {}
+        for name in names:
+            if INDEX_SEPARATOR in name:
+                collection_name, field = name.split(INDEX_SEPARATOR, 1)
+                indexed_fields.setdefault(collection_name, set()).add(field)
+        self._indexed_fields = indexed_fields
+        self._tables = {name for name in names if INDEX_SEPARATOR not in name}
+
+    def _table(self, collection_name):
+        """Quoted table name of a collection, or None if the database has no such collection"""
+        self._connection()
+        return _quote(collection_name) if collection_name in self._tables else None
+
+    def get_by_id(self, collection_name, title_id):
+        """The first document of a collection with this id, or None"""
+        table = self._table(collection_name)
+        if table is None:
+            return None
+        row = self._connection().execute(f'SELECT doc FROM {table} WHERE id = ? ORDER BY position LIMIT 1',
+                                         (canonical_id(title_id),)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def get_many(self, collection_name, ids):
+        """Documents for several ids in one query, keyed by id"""
+        table = self._table(collection_name)
+        ids = [canonical_id(title_id) for title_id in ids]
+        if table is None or not ids:
+            return {}
+        found = {}
+        rows = self._connection().execute(f'SELECT id, doc FROM {table} WHERE id IN (SELECT value FROM json_each(?)) '
+                                          f'ORDER BY position', (json.dumps(ids),))
+        for title_id, doc in rows:
+            if title_id not in found:
+                found[title_id] = _loads(doc)
+        return found
+
+    def _plan(self, collection_name, query):
+        """(indexed fields used, SQL, params) for a query"""
+        table = _quote(collection_name)
+        indexed_fields = self._indexed_fields.get(collection_name, set())
+        used = []
+        clauses = []
+        params = []
+        for field, condition in (query or {}).items():
+            if field == 'id':
+                narrowed = _sql_condition('id', condition)
+            elif field in indexed_fields:
+                narrowed = _sql_condition('value', condition)
+                if narrowed is not None:
+                    side_table = _quote(collection_name + INDEX_SEPARATOR + field)
+                    narrowed = (f'position IN (SELECT doc FROM {side_table} WHERE {narrowed[0]})', narrowed[1])
+            else:
+                narrowed = None
+            if narrowed is None:
+                continue
+            used.append(field)
+            clauses.append(narrowed[0])
+            params.extend(narrowed[1])
+        where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+        return used, f'SELECT doc FROM {table}{where} ORDER BY position', params
+
+    def explain(self, collection_name, query):
+        """How find() would run a query, with SQLite's own plan"""
+        if self._table(collection_name) is None:
+            return None
+        used, sql, params = self._plan(collection_name, query)
+        return {
+            'collection': collection_name,
+            'plan': 'index' if used else 'scan',
+            'indexes': used,
+            'sql': sql,
+            'sqlite_plan': [row[-1] for row in self._connection().execute(f'EXPLAIN QUERY PLAN {sql}', params)],
+        }
+
+    def find(self, collection_name, query=None, projection=None, limit=None):
+        """
+        Documents matching a MongoDB-style query, in collection order (same
+        operators as JSONDatabase.find)
+        """
+        if self._table(collection_name) is None:
+            return []
+        _, sql, params = self._plan(collection_name, query)
+        if not query and limit and limit > 0:
+            sql += f' LIMIT {int(limit)}'
+        results = []
+        for (doc,) in self._connection().execute(sql, params):
+            document = _loads(doc)
+            if query and not matches(document, query):
+                continue
+            results.append(apply_projection(document, projection))
+            if limit and 0 < limit <= len(results):
+                break
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the embedded SQLite database from the JSON exports")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Build the database from a data directory")
+    build_parser.add_argument('--data-dir', default='data/processed')
+    build_parser.add_argument('--path', default=os.getenv('SQLITE_PATH', DEFAULT_PATH))
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        build(args.data_dir, args.path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# src/data/storage.py
+"""
+Read interface shared by the storage backends, and the factory the web app
+uses to open the configured one (STORAGE_BACKEND):
+
+- 'mongo': src.data.database.Database, the MongoDB Atlas catalog
+- 'json': src.data.json_database.JSONDatabase, the exported JSON files in memory
+- 'sqlite': src.data.sqlite_database.SQLiteDatabase, an embedded SQLite file
+  built from those exports, for single-box deployments and tests
+
+Every backend returns documents in the normalized shape (src/data/normalize.py)
+and without MongoDB's '_id'. A backend implements get_by_id, get_many and find;
+the title, card and genre helpers are built on those.
+"""
+import os
+
+from src.data.normalize import CARD_COLLECTIONS, canonical_id, card, normalize_document
+
+STORAGE_BACKENDS = ('mongo', 'json', 'sqlite')
+
+# Detailed collection each card collection is derived from
+DETAILED_COLLECTIONS = {
+    'movie': 'detailed_movies',
+    'series': 'detailed_series',
+}
+
+
+def apply_projection(document, projection):
+    """
+    MongoDB-style projection of top-level fields: {'title': 1, ...} keeps the
+    listed fields, {'overview': 0, ...} drops them. '_id' is never stored.
+    """
+    if not projection:
+        return document
+    fields = {field: value for field, value in projection.items() if field != '_id'}
+    if any(fields.values()):
+        return {field: document[field] for field in fields if fields[field] and field in document}
+    return {field: value for field, value in document.items() if field not in fields}
+
+
+class Storage:
+    """Interface of a storage backend"""
+
+    def get_by_id(self, collection_name, title_id):
+        """The first document of a collection with this id, or None"""
+        raise NotImplementedError
+
+    def get_many(self, collection_name, ids):
+        """Documents for several ids in one lookup, keyed by canonical id"""
+        raise NotImplementedError
+
+    def find(self, collection_name, query=None, projection=None, limit=None):
+        """Documents matching a MongoDB-style query, in collection order"""
+        raise NotImplementedError
+
+    def find_one(self, collection_name, query, projection=None):
+        results = self.find(collection_name, query, projection=projection, limit=1)
+        return results[0] if results else None
+
+    def get_detailed_movie(self, movie_id):
+        return self.get_by_id('detailed_movies', movie_id)
+
+    def get_detailed_series(self, series_id):
+        return self.get_by_id('detailed_series', series_id)
+
+    def get_movie_cards(self, movie_ids):
+        return self._cards('movie', movie_ids)
+
+    def get_series_cards(self, series_ids):
+        return self._cards('series', series_ids)
+
+    def _cards(self, kind, ids):
+        ids = [canonical_id(title_id) for title_id in ids]
+        found = self.get_many(CARD_COLLECTIONS[kind], ids)
+        missing = [title_id for title_id in ids if title_id not in found]
+        if missing:
+            # Stores built before the card collections existed
+            for title_id, document in self.get_many(DETAILED_COLLECTIONS[kind], missing).items():
+                found[title_id] = card(normalize_document(document, kind), kind)
+        return found
+
+    def get_movie_genres(self):
+        return self.find('movie_genres')
+
+    def get_tv_genres(self):
+        return self.find('tv_genres')
+
+
+def open_storage(backend=None, config=None):
+    """
+    The configured backend. config is a mapping such as the Flask app config
+    (JSON_DATA_DIR, SQLITE_PATH, STORAGE_CACHE_MB, ...); the backend module is
+    imported only here, so pymongo is never loaded by an app that doesn't use it.
+    MongoDB and SQLite lookups go through the read-through cache
+    (src/data/cache.py). So do those of the JSON backend in lazy mode, which
+    decodes a document from the file on every read; otherwise it already holds
+    everything in memory.
+    """
+    from src.data.cache import cached_storage
+
+    config = config or {}
+    backend = (backend or os.getenv('STORAGE_BACKEND') or 'mongo').lower()
+    if backend == 'mongo':
+        from src.data.database import Database
+        return cached_storage(Database(), config)
+    if backend == 'json':
+        from src.data.json_database import JSONDatabase
+        db = JSONDatabase(config.get('JSON_DATA_DIR') or 'data/processed')
+        return cached_storage(db, config) if db.lazy else db
+    if backend == 'sqlite':
+        from src.data.sqlite_database import SQLiteDatabase
+        return cached_storage(SQLiteDatabase(config.get('SQLITE_PATH')), config)
+    raise ValueError(f"Unknown storage backend {backend!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
@@ -0,0 +1,257 @@
+# src/instrumentation.py
+"""
+Per-request timing spans, exported as a Server-Timing header and as
+Prometheus metrics on /metrics.
+
+Code marks a stage with `with span('name'):` or the @timed('name')
+decorator. Inside a request the time is added to that request's trace; outside
+a request (builds, scripts) a span costs one context-variable lookup. Spans
+record exclusive time, so a stage nested in another is not counted twice.
+
+Work handed to a thread pool is traced too when it is submitted with
+contextvars.copy_context().run: each thread keeps its own span stack and adds
+to the same request trace. Stages that run in parallel can then add up to
+more than the request's wall time.
+
+The stages used by the app are:
+
+    model_load      getting (and on first use loading) a model
+    similarity      content similarity ranking
+    hybrid          hybrid scoring of the similar titles
+    model_lookup    finding a title's row in the model dataframe
+    storage_lookup  fetching title documents and cards from storage
+    normalize       reshaping stored documents for the templates
+    enrich          waiting for the parallel detail lookups
+    render          template rendering
+
+init_app(app) starts a trace per request, adds the Server-Timing header and
+registers /metrics. Metrics are per process; with several gunicorn workers
+each scrape sees the worker that answered it. Set INSTRUMENTATION=0 to turn
+it all off.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ENABLED = os.getenv('INSTRUMENTATION', '1') == '1'
+
+_current_trace = ContextVar('trace', default=None)
+
+
+class Trace:
+    """Exclusive time per stage for one request"""
+
+    __slots__ = ('start', 'stages', 'stacks', 'lock')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # name -> seconds
+        self.stages = {}
+        # thread id -> [name, start, time spent in nested spans] of its open spans
+        self.stacks = {}
+        self.lock = threading.Lock()
+
+    def stack(self):
+        """Open spans of the calling thread"""
+        return self.stacks.setdefault(threading.get_ident(), [])
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def snapshot(self):
+        """Copy of the stage times; pool threads may still be adding to them"""
+        with self.lock:
+            return dict(self.stages)
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'stack')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.stack = trace.stack()
+
+    def __enter__(self):
+        self.stack.append([self.name, time.perf_counter(), 0.0])
+        return self
+
+    def __exit__(self, *exc_info):
+        name, start, nested = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.trace.add(name, elapsed - nested)
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing a stage of the current request"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name)
+
+
+def timed(name):
+    """Decorator timing every call of a function as a stage"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus model"""
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        position = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[position] += 1
+            series[-1] += seconds
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series_items = [(labels, list(series)) for labels, series in sorted(self._series.items())]
+        for labels, series in series_items:
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            count = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), series[:-1]):
+                count += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram('imdb_request_duration_seconds', 'Request latency by endpoint and status',
+                            ('endpoint', 'method', 'status'))
+STAGE_SECONDS = Histogram('imdb_stage_duration_seconds', 'Exclusive time per request stage',
+                          ('endpoint', 'stage'))
+
+# Extra metric sources: callables returning {name: number}, exported as gauges
+_gauge_sources = {}
+
+
+def register_gauges(prefix, source):
+    """Export the numeric values of source() (e.g. cache stats) as prefix_<key> gauges"""
+    _gauge_sources[prefix] = source
+
+
+def metrics_text():
+    """All metrics in the Prometheus text exposition format"""
+    lines = REQUEST_SECONDS.exposition() + STAGE_SECONDS.exposition()
+    for prefix, source in sorted(_gauge_sources.items()):
+        try:
+            values = source() or {}
+        except Exception:
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)):
+                lines.append(f'# TYPE {prefix}_{key} gauge')
+                lines.append(f'{prefix}_{key} {float(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(stages, total):
+    """Server-Timing header value for the stage times of a finished trace"""
+    entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stages.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def init_app(app):
+    """Trace every request of a Flask app and serve /metrics"""
+    if not ENABLED:
+        return
+    from flask import Response, g, request, before_render_template, template_rendered
+
+    @app.before_request
+    def _start_trace():
+        trace = Trace()
+        g.trace_token = _current_trace.set(trace)
+        g.trace = trace
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = g.pop('trace', None)
+        if trace is None:
+            return response
+        total = time.perf_counter() - trace.start
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe((endpoint, request.method, str(response.status_code)), total)
+        stages = trace.snapshot()
+        for name, seconds in stages.items():
+            STAGE_SECONDS.observe((endpoint, name), seconds)
+        response.headers['Server-Timing'] = server_timing(stages, total)
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # Set in another context; the request's context is discarded anyway
+                pass
+
+    # Rendering is timed through Flask's template signals, so the views stay unchanged
+    def _render_started(sender, template, context, **extra):
+        trace = _current_trace.get()
+        if trace is not None:
+            _Span(trace, 'render').__enter__()
+
+    def _render_finished(sender, template, context, **extra):
+        trace = _current_trace.get()
+        if trace is not None and trace.stack() and trace.stack()[-1][0] == 'render':
+            _Span(trace, 'render').__exit__(None, None, None)
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
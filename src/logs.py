@@ -0,0 +1,134 @@
+# src/logs.py
+"""
+Logging for the web app and the modules on its request path.
+
+Modules log through `logger = get_logger(__name__)` with %-style arguments,
+so a message below the configured level is never formatted. Extra fields go
+in `extra={...}` and are written as key=value pairs (or JSON fields with
+LOG_FORMAT=json).
+
+configure_logging() routes every record through a QueueHandler: the request
+thread only enqueues the record, and a background QueueListener does the
+formatting and the write to stderr. Debug records can be sampled per call
+site (LOG_DEBUG_SAMPLE=N keeps one in N) so a hot debug line can stay enabled.
+
+The most verbose debug lines are wrapped in `if __debug__:`, which Python
+removes at compile time when it runs optimized (PYTHONOPTIMIZE=1 or -O), so
+in production they cost nothing at all.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_configured = False
+_listener = None
+_queue_handler = None
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class StructuredFormatter(logging.Formatter):
+    """'time level logger message key=value ...', or one JSON object per line"""
+
+    def __init__(self, json_format=False):
+        super().__init__()
+        self.json_format = json_format
+
+    def format(self, record):
+        message = record.getMessage()
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z'
+        fields = _extra_fields(record)
+        if self.json_format:
+            entry = {'time': timestamp, 'level': record.levelname, 'logger': record.name, 'message': message}
+            entry.update(fields)
+            if record.exc_info or record.exc_text:
+                entry['exception'] = record.exc_text or self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        line = f'{timestamp} {record.levelname:<7} {record.name} {message}'
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        if record.exc_info or record.exc_text:
+            line += '\n' + (record.exc_text or self.formatException(record.exc_info))
+        return line
+
+
+class SampleFilter(logging.Filter):
+    """Keeps one in `every` debug records per call site; other levels always pass"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(int(every), 1)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(site, 0)
+            self._counts[site] = count + 1
+        return count % self.every == 0
+
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only make the record safe to hand over
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _start_listener():
+    """(Re)start the thread that writes queued records; also runs in a forked worker"""
+    global _listener
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(StructuredFormatter(json_format=os.getenv('LOG_FORMAT', 'text') == 'json'))
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging(level=None, debug_sample=None):
+    """
+    Send records at LOG_LEVEL (INFO by default) and above to stderr through a
+    queue. Safe to call more than once.
+    """
+    global _configured, _queue_handler
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _configured:
+        return
+    _configured = True
+
+    _queue_handler = _PreparedQueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(SampleFilter(debug_sample or os.getenv('LOG_DEBUG_SAMPLE', '1')))
+    root.addHandler(_queue_handler)
+    _start_listener()
+    atexit.register(_stop_listener)
+    # Threads don't survive a fork; a preforked worker needs its own listener
+    os.register_at_fork(after_in_child=_start_listener)
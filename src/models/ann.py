@@ -0,0 +1,207 @@
+# src/models/ann.py
+"""
+Approximate nearest neighbour scoring for large catalogs.
+
+IVFIndex projects the weighted TF-IDF rows to a few hundred dense dimensions
+with TruncatedSVD, clusters them with k-means and keeps one inverted list of
+titles per cluster. A query only scores the titles in the n_probe clusters
+closest to it, so cost grows with n_probe * N / n_lists instead of N.
+
+    python -m src.models.ann models/movie_recommender.joblib --report
+    python -m src.models.ann models/series_recommender.joblib --n-lists 512 --n-probe 16 --save
+
+--save stores the index in the artifact and switches it to the 'ann'
+similarity backend, so the get_*_recommendations_by_id functions use it.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.models.catalog import detach_catalog, load_artifact
+from src.models.content_based import FeatureSimilarity, _top_indices, catalog_feature_matrix
+
+DEFAULT_COMPONENTS = 128
+DEFAULT_PROBE = 8
+
+
+class IVFIndex:
+    """Inverted-file index over a reduced-dimension projection of the feature matrix"""
+
+    def __init__(self, n_components=DEFAULT_COMPONENTS, n_lists=None, n_probe=DEFAULT_PROBE, random_state=0):
+        self.n_components = n_components
+        self.n_lists = n_lists
+        # Recall/latency knob: more probed lists means more candidates scored
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def fit(self, feature_matrix):
+        """Project, cluster and build the inverted lists"""
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import TruncatedSVD
+
+        n_titles, n_features = feature_matrix.shape
+        n_components = max(1, min(self.n_components, n_features - 1, n_titles - 1))
+        self.svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+        self.embeddings = self._normalize(self.svd.fit_transform(feature_matrix))
+
+        # Roughly sqrt(N) lists keeps both the centroid scan and the lists short
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_titles)))
+        n_lists = min(n_lists, n_titles)
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3,
+                                 batch_size=max(1024, n_lists * 4))
+        self.labels = kmeans.fit_predict(self.embeddings).astype(np.int64)
+        self.centroids = self._normalize(kmeans.cluster_centers_)
+        self.n_lists = n_lists
+        self._build_lists()
+        return self
+
+    def _build_lists(self):
+        # Members of list j are list_members[list_offsets[j]:list_offsets[j + 1]]
+        self.list_members = np.argsort(self.labels, kind='stable').astype(np.int64)
+        self.list_offsets = np.searchsorted(self.labels[self.list_members],
+                                            np.arange(self.n_lists + 1)).astype(np.int64)
+
+    def add(self, feature_rows):
+        """Append new titles to the index, assigning each to its nearest existing list"""
+        embedded = self.embed(feature_rows)
+        labels = np.argmax(embedded @ self.centroids.T, axis=1).astype(np.int64)
+        self.embeddings = np.vstack([self.embeddings, embedded])
+        self.labels = np.concatenate([self.labels, labels])
+        self._build_lists()
+        return self
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def embed(self, feature_rows):
+        """Project feature rows (e.g. from content_based.transform_documents) into the index space"""
+        return self._normalize(self.svd.transform(feature_rows))
+
+    def _candidates(self, vector, n_probe):
+        n_probe = max(1, min(n_probe, self.n_lists))
+        centroid_scores = self.centroids @ vector
+        probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([self.list_members[self.list_offsets[j]:self.list_offsets[j + 1]] for j in probes])
+
+    def search(self, vector, k, n_probe=None):
+        """Return (positions, scores) of the approximate top k titles for an embedded vector"""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        candidates = self._candidates(vector, n_probe or self.n_probe)
+        scores = self.embeddings[candidates] @ vector
+        top = _top_indices(scores.astype(float), k)
+        return candidates[top], scores[top]
+
+    def row(self, idx):
+        """
+        Similarity row for title idx, as read by content_based.
+        Titles outside the probed lists are -inf, i.e. not retrieved.
+        """
+        vector = self.embeddings[idx]
+        candidates = self._candidates(vector, self.n_probe)
+        scores = np.full(self.embeddings.shape[0], -np.inf)
+        scores[candidates] = self.embeddings[candidates] @ vector
+        return scores
+
+
+def recall_at_k(index, feature_matrix, k=10, n_queries=200, n_probe_values=None, random_state=0):
+    """
+    Recall@k and mean query latency of the index against exact cosine
+    similarity over the full weighted TF-IDF features, for each n_probe.
+    """
+    exact = FeatureSimilarity(feature_matrix)
+    n_titles = feature_matrix.shape[0]
+    rng = np.random.default_rng(random_state)
+    queries = rng.choice(n_titles, size=min(n_queries, n_titles), replace=False)
+
+    # Exact neighbours, excluding the query itself
+    truth = {}
+    exact_time = 0.0
+    for idx in queries:
+        start = time.perf_counter()
+        scores = exact.row(idx)
+        scores[idx] = -np.inf
+        truth[idx] = set(_top_indices(scores, k).tolist())
+        exact_time += time.perf_counter() - start
+
+    results = []
+    original_probe = index.n_probe
+    try:
+        for n_probe in n_probe_values or [original_probe]:
+            index.n_probe = n_probe
+            hits = 0
+            elapsed = 0.0
+            for idx in queries:
+                start = time.perf_counter()
+                scores = index.row(idx)
+                scores[idx] = -np.inf
+                found = _top_indices(scores, k)
+                elapsed += time.perf_counter() - start
+                hits += len(truth[idx].intersection(found.tolist()))
+            results.append({
+                'n_probe': n_probe,
+                'recall_at_k': hits / (len(queries) * k),
+                'ann_ms': 1000 * elapsed / len(queries),
+                'exact_ms': 1000 * exact_time / len(queries),
+            })
+    finally:
+        index.n_probe = original_probe
+    return results
+
+
+def print_recall_report(results, k):
+    print(f"\n{'n_probe':>8} {'recall@' + str(k):>10} {'ann ms':>9} {'exact ms':>9}")
+    for row in results:
+        print(f"{row['n_probe']:>8} {row['recall_at_k']:>10.3f} {row['ann_ms']:>9.2f} {row['exact_ms']:>9.2f}")
+
+
+def main(argv=None):
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Build an ANN index for a recommender artifact")
+    parser.add_argument('artifact', help="Path to movie_recommender.joblib or series_recommender.joblib")
+    parser.add_argument('--n-components', type=int, default=DEFAULT_COMPONENTS, help="TruncatedSVD dimensions")
+    parser.add_argument('--n-lists', type=int, default=None, help="Inverted lists (default sqrt(N))")
+    parser.add_argument('--n-probe', type=int, default=DEFAULT_PROBE, help="Lists scored per query")
+    parser.add_argument('--report', action='store_true', help="Print recall@k against exact cosine")
+    parser.add_argument('--k', type=int, default=10, help="k for the recall report")
+    parser.add_argument('--queries', type=int, default=200, help="Sampled queries for the recall report")
+    parser.add_argument('--save', action='store_true', help="Store the index in the artifact and use the 'ann' backend")
+    args = parser.parse_args(argv)
+
+    model = load_artifact(args.artifact, columns=None)
+    feature_matrix = catalog_feature_matrix(model)
+    print(f"Feature matrix: {feature_matrix.shape[0]} titles x {feature_matrix.shape[1]} features")
+
+    start = time.perf_counter()
+    index = IVFIndex(n_components=args.n_components, n_lists=args.n_lists, n_probe=args.n_probe).fit(feature_matrix)
+    print(f"Built IVF index ({index.n_lists} lists, {index.embeddings.shape[1]} dims) "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    if args.report:
+        probes = sorted({1, 2, 4, args.n_probe, 2 * args.n_probe, 4 * args.n_probe})
+        print_recall_report(recall_at_k(index, feature_matrix, k=args.k, n_queries=args.queries,
+                                        n_probe_values=probes), args.k)
+
+    if args.save:
+        model['ann_index'] = index
+        model['similarity_backend'] = 'ann'
+        # Kept so src.models.update can score later additions against these titles
+        model['feature_matrix'] = feature_matrix
+        tmp_path = args.artifact + '.tmp'
+        joblib.dump(detach_catalog(model), tmp_path, compress=3)
+        os.replace(tmp_path, args.artifact)
+        print(f"Saved index to {args.artifact}")
+
+
+if __name__ == '__main__':
+    main()
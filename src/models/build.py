@@ -0,0 +1,469 @@
+# src/models/build.py
+"""
+Offline build of the content-based recommender artifacts.
+
+This is the feature engineering and similarity build from
+notebooks/movie_recommender.ipynb and series_recommender.ipynb as a
+command line job:
+
+    python -m src.models.build movies
+    python -m src.models.build series --source json --input data/raw_data/detailed_series.json
+
+The artifacts have the same layout the web app loads
+(tfidf_vectorizers, feature_weights, feature_matrix, cosine_sim for the
+matrix backend, indices, movies_df/series_df).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, hstack
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import MinMaxScaler, normalize
+
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.models.catalog import prune_catalogs, split_catalog
+from src.models.quantize import SIMILARITY_DTYPES, quantize_similarity
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'models')
+
+# Number of neighbours kept per title in the sparse similarity matrix
+DEFAULT_TOP_K = 15
+
+# Rows and catalog columns scored per step of the blocked similarity build
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_COL_BLOCK_SIZE = 8192
+
+# Numerical columns scaled to [0, 1] for the hybrid score
+SCALED_FEATURES = ['popularity', 'vote_average', 'vote_count']
+
+# Build configuration for each kind of title.
+# Features are (name, text column, weight, extra TfidfVectorizer arguments).
+MODEL_CONFIGS = {
+    'movies': {
+        'collection': 'detailed_movies',
+        'raw_file': 'data/raw_data/detailed_movies.json',
+        'artifact': 'movie_recommender.joblib',
+        'df_key': 'movies_df',
+        'title_field': 'title',
+        'features': [
+            ('title', 'title_text', 2.5, {}),
+            ('genre', 'genre_text', 3.5, {}),
+            ('overview', 'overview_text', 1.0, {'max_features': 5000}),
+            ('keywords', 'keywords_text', 10.0, {}),
+            ('directors', 'directors_text', 1.5, {}),
+            ('cast', 'cast_text', 2.5, {}),
+            ('companies', 'companies_text', 0.5, {}),
+        ],
+        'projection': ['id', 'title', 'genres', 'vote_average', 'vote_count', 'popularity',
+                       'poster_path', 'overview', 'keywords', 'credits', 'production_companies'],
+    },
+    'series': {
+        'collection': 'detailed_series',
+        'raw_file': 'data/raw_data/detailed_series.json',
+        'artifact': 'series_recommender.joblib',
+        'df_key': 'series_df',
+        'title_field': 'name',
+        'features': [
+            ('name', 'name_text', 2.5, {}),
+            ('genre', 'genre_text', 4.0, {}),
+            ('overview', 'overview_text', 1.5, {'max_features': 5000}),
+            ('keywords', 'keywords_text', 9.0, {}),
+            ('creators', 'creators_text', 2.0, {}),
+            ('cast', 'cast_text', 2.5, {}),
+            ('companies', 'companies_text', 0.5, {}),
+            ('networks', 'networks_text', 1.5, {}),
+        ],
+        'projection': ['id', 'name', 'genres', 'vote_average', 'vote_count', 'popularity',
+                       'poster_path', 'overview', 'keywords', 'credits', 'created_by',
+                       'production_companies', 'networks'],
+    },
+}
+
+
+class StageTimer:
+    """Collects wall-clock timings for the stages of a build"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        print(f"[{name}] started")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = round(elapsed, 3)
+            print(f"[{name}] finished in {elapsed:.2f}s")
+
+    def report(self):
+        total = sum(self.timings.values())
+        print("\nBuild timings:")
+        for name, elapsed in self.timings.items():
+            print(f"  {name:<20} {elapsed:8.2f}s")
+        print(f"  {'total':<20} {total:8.2f}s")
+
+
+# Joined-name text features: (column, path to a list of TMDb {'name': ...}
+# dicts in the document, options). Options keep the first `limit` items or
+# only the items whose 'job' is `job`.
+TEXT_FEATURES = {
+    'movies': [
+        ('keywords_text', ('keywords', 'keywords'), {}),
+        ('directors_text', ('credits', 'crew'), {'job': 'Director'}),
+        ('cast_text', ('credits', 'cast'), {'limit': 5}),
+        ('companies_text', ('production_companies',), {}),
+    ],
+    'series': [
+        ('keywords_text', ('keywords', 'results'), {}),
+        ('creators_text', ('created_by',), {}),
+        ('cast_text', ('credits', 'cast'), {'limit': 5}),
+        ('companies_text', ('production_companies',), {}),
+        ('networks_text', ('networks',), {}),
+    ],
+}
+
+
+def _column(df, path):
+    """A (possibly nested) document field as a column; missing or non-dict levels become NaN"""
+    if path[0] not in df:
+        return pd.Series(np.nan, index=df.index, dtype=object)
+    column = df[path[0]].astype(object)
+    for key in path[1:]:
+        column = column.str.get(key)
+    return column
+
+
+def _items(column):
+    """One row per list element, indexed by the row of the list; non-lists are dropped"""
+    lists = column.astype(object).where(column.map(lambda value: isinstance(value, list)), None)
+    return lists.explode().dropna().astype(object)
+
+
+def joined_names(column, limit=None, job=None):
+    """Space-joined 'name' values of each row's list of dicts"""
+    items = _items(column)
+    if limit is not None:
+        items = items[(items.groupby(level=0).cumcount() < limit).to_numpy()]
+    if job is not None:
+        items = items[(items.str.get('job') == job).to_numpy()]
+    names = items.str.get('name').dropna().astype(str)
+    return names.groupby(level=0).agg(' '.join).reindex(column.index, fill_value='')
+
+
+def genre_name_lists(column):
+    """Genre names of each row, from a TMDb 'genres' list (dicts or plain strings)"""
+    items = _items(column)
+    # Index labels repeat after explode, so combine the two cases by position
+    plain = items.map(lambda value: isinstance(value, str)).to_numpy()
+    names = pd.Series(np.where(plain, items.to_numpy(), items.str.get('name').to_numpy()), index=items.index)
+    grouped = names.dropna().groupby(level=0).agg(list).reindex(column.index)
+    return grouped.map(lambda value: value if isinstance(value, list) else [])
+
+
+def load_documents(kind, source='mongo', input_path=None):
+    """Load detailed documents from MongoDB or a JSON export"""
+    config = MODEL_CONFIGS[kind]
+    if source == 'json':
+        path = input_path or os.path.join(PROJECT_ROOT, config['raw_file'])
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    from src.data.database import Database
+    db = Database()
+    # Only fetch the fields the build uses
+    projection = {field: 1 for field in config['projection']}
+    projection['_id'] = 0
+    return list(db.db[config['collection']].find({}, projection))
+
+
+def build_frame(kind, documents):
+    """Build the title dataframe with extracted text features, column by column"""
+    config = MODEL_CONFIGS[kind]
+    title_field = config['title_field']
+
+    # Drop documents without an id and repeated ids, and sort by id so the
+    # row order (and therefore the artifact) does not depend on load order
+    documents = [doc for doc in documents if doc.get('id') is not None]
+    fields = list(dict.fromkeys(['id', title_field, 'vote_average', 'vote_count', 'popularity', 'poster_path',
+                                 'overview', 'genres'] + [path[0] for _, path, _ in TEXT_FEATURES[kind]]))
+    docs = pd.DataFrame.from_records(documents, columns=fields)
+    docs = docs.drop_duplicates(subset='id', keep='first').sort_values('id', kind='stable').reset_index(drop=True)
+
+    df = docs[['id', title_field, 'vote_average', 'vote_count', 'popularity', 'poster_path', 'overview']].copy()
+    df['genre_names'] = genre_name_lists(docs['genres'])
+    df[f'{title_field}_text'] = docs[title_field].where(docs[title_field].notna(), '').astype(str)
+    df['genre_text'] = df['genre_names'].str.join(' ')
+    df['overview_text'] = docs['overview'].where(docs['overview'].notna(), '').astype(str)
+    for column, path, options in TEXT_FEATURES[kind]:
+        df[column] = joined_names(_column(docs, path), **options)
+    return df
+
+
+def scale_features(df):
+    """Add *_scaled columns and return the fitted scalers"""
+    scalers = {}
+    for column in SCALED_FEATURES:
+        values = pd.to_numeric(df[column], errors='coerce')
+        values = values.fillna(values.median()).fillna(0.0)
+        scaler = MinMaxScaler()
+        df[f'{column}_scaled'] = scaler.fit_transform(values.to_numpy().reshape(-1, 1)).ravel()
+        scalers[column] = scaler
+    return scalers
+
+
+def fit_vectorizers(kind, df, timer):
+    """Fit each TF-IDF vectorizer once and return (vectorizers, weighted feature matrix)"""
+    vectorizers = {}
+    blocks = []
+    for name, column, weight, kwargs in MODEL_CONFIGS[kind]['features']:
+        with timer.stage(f'tfidf:{name}'):
+            vectorizer = TfidfVectorizer(stop_words='english', **kwargs)
+            matrix = vectorizer.fit_transform(df[column])
+            vectorizers[name] = vectorizer
+            blocks.append(weight * matrix)
+    return vectorizers, hstack(blocks, format='csr')
+
+
+def artifact_columns(kind):
+    """Dataframe columns stored in the artifact"""
+    config = MODEL_CONFIGS[kind]
+    text_columns = [column for _, column, _, _ in config['features']]
+    return ['id', config['title_field'], 'genre_names', 'vote_average', 'popularity', 'poster_path',
+            'overview', 'popularity_scaled', 'vote_average_scaled', 'vote_count_scaled'] + text_columns
+
+
+def feature_weights(kind):
+    """Weights in the artifact's {'<name>_weight': value} layout"""
+    return {f'{name}_weight': weight for name, _, weight, _ in MODEL_CONFIGS[kind]['features']}
+
+
+def _top_k_block(normalized, transposed, start, stop, top_k, col_block_size):
+    """
+    Top-k neighbours for rows [start, stop).
+
+    The block is multiplied against one column tile of the catalog at a time
+    and merged into a bounded (rows x top_k) candidate set, so memory is
+    proportional to block size x tile size rather than to the catalog size.
+    """
+    block = normalized[start:stop]
+    n_cols = transposed.shape[1]
+    n_block_rows = stop - start
+    row_ids = np.arange(start, stop)
+
+    best_vals = np.full((n_block_rows, top_k), -np.inf)
+    best_cols = np.full((n_block_rows, top_k), -1, dtype=np.int64)
+
+    for col_start in range(0, n_cols, col_block_size):
+        col_stop = min(col_start + col_block_size, n_cols)
+        tile = (block @ transposed[:, col_start:col_stop]).toarray()
+
+        # Exclude self similarity
+        in_tile = (row_ids >= col_start) & (row_ids < col_stop)
+        tile[np.flatnonzero(in_tile), row_ids[in_tile] - col_start] = -np.inf
+
+        # Merge the tile into the running top-k of each row
+        vals = np.concatenate([best_vals, tile], axis=1)
+        cols = np.concatenate([best_cols, np.broadcast_to(np.arange(col_start, col_stop), tile.shape)], axis=1)
+        keep = np.argpartition(vals, -top_k, axis=1)[:, -top_k:]
+        best_vals = np.take_along_axis(vals, keep, axis=1)
+        best_cols = np.take_along_axis(cols, keep, axis=1)
+
+    # Only positive similarities are stored
+    mask = best_vals > 0
+    rows = np.broadcast_to(row_ids[:, None], mask.shape)[mask]
+    return rows, best_cols[mask], best_vals[mask]
+
+
+# Matrices shared with pool workers, set once per process by _init_worker
+_worker_matrices = None
+
+
+def _init_worker(normalized, transposed):
+    global _worker_matrices
+    _worker_matrices = (normalized, transposed)
+
+
+def _top_k_block_worker(task):
+    start, stop, top_k, col_block_size = task
+    normalized, transposed = _worker_matrices
+    return _top_k_block(normalized, transposed, start, stop, top_k, col_block_size)
+
+
+def compute_top_k_similarity(features, top_k=DEFAULT_TOP_K, block_size=DEFAULT_BLOCK_SIZE,
+                             col_block_size=DEFAULT_COL_BLOCK_SIZE, n_jobs=1):
+    """
+    Sparse cosine similarity keeping the top_k positive neighbours of each row.
+    The diagonal (self similarity) is excluded.
+
+    Rows of the L2-normalized feature matrix are processed in blocks of
+    block_size, optionally spread over n_jobs worker processes. Peak memory
+    depends on block_size and col_block_size, never on the full N x N product.
+    """
+    normalized = normalize(features, norm='l2', axis=1, copy=True).tocsr()
+    transposed = normalized.T.tocsc()
+    n_rows = normalized.shape[0]
+    top_k = max(1, min(top_k, n_rows))
+
+    tasks = [(start, min(start + block_size, n_rows), top_k, col_block_size)
+             for start in range(0, n_rows, block_size)]
+
+    row_parts, col_parts, val_parts = [], [], []
+
+    def collect(result, done):
+        rows, cols, vals = result
+        row_parts.append(rows)
+        col_parts.append(cols)
+        val_parts.append(vals)
+        print(f"Processed {done}/{n_rows} titles")
+
+    if n_jobs is not None and n_jobs != 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        workers = os.cpu_count() if n_jobs < 1 else n_jobs
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(normalized, transposed)) as executor:
+            for task, result in zip(tasks, executor.map(_top_k_block_worker, tasks)):
+                collect(result, task[1])
+    else:
+        for task in tasks:
+            start, stop, _, _ = task
+            collect(_top_k_block(normalized, transposed, start, stop, top_k, col_block_size), stop)
+
+    if not row_parts:
+        return csr_matrix((n_rows, n_rows))
+
+    return csr_matrix((np.concatenate(val_parts), (np.concatenate(row_parts), np.concatenate(col_parts))),
+                      shape=(n_rows, n_rows))
+
+
+def build_model(kind, documents, top_k=DEFAULT_TOP_K, timer=None, block_size=DEFAULT_BLOCK_SIZE, n_jobs=1,
+                backend='matrix', similarity_dtype='float64'):
+    """
+    Build the model components dict for 'movies' or 'series'.
+
+    backend='matrix' stores the precomputed top-k cosine_sim matrix;
+    backend='features' scores similarity per request from the normalized
+    feature matrix (see content_based.FeatureSimilarity), which both store.
+    """
+    config = MODEL_CONFIGS[kind]
+    timer = timer or StageTimer()
+
+    with timer.stage('extract'):
+        df = build_frame(kind, documents)
+    print(f"Extracted features for {len(df)} {kind}")
+
+    with timer.stage('scale'):
+        scalers = scale_features(df)
+
+    vectorizers, weighted_features = fit_vectorizers(kind, df, timer)
+
+    # Every backend keeps the normalized feature rows, which incremental updates
+    # (src/models/update.py) score new titles against and append to
+    with timer.stage('normalize'):
+        similarity = {'similarity_backend': backend,
+                      'feature_matrix': normalize(weighted_features, norm='l2', axis=1).tocsr()}
+    if backend != 'features':
+        with timer.stage('similarity'):
+            cosine_sim = compute_top_k_similarity(weighted_features, top_k=top_k,
+                                                  block_size=block_size, n_jobs=n_jobs)
+        # Optionally store the top-k matrix at reduced precision (see src/models/quantize.py)
+        similarity['cosine_sim'] = quantize_similarity(cosine_sim, similarity_dtype)
+
+    title_field = config['title_field']
+    columns = artifact_columns(kind)
+
+    model = {
+        'tfidf_vectorizers': vectorizers,
+        'feature_weights': feature_weights(kind),
+        'indices': pd.Series(df.index, index=df[title_field]),
+        config['df_key']: df[columns],
+        'scalers': scalers,
+        'build_info': {
+            'kind': kind,
+            'version': 1,
+            'built_at': datetime.now(timezone.utc).isoformat(),
+            'n_titles': len(df),
+            'top_k': top_k,
+            'similarity_dtype': similarity_dtype if backend == 'matrix' else None,
+            'timings': timer.timings,
+        },
+    }
+    model.update(similarity)
+    return model
+
+
+def save_model(model, path, compress=3, catalog=False):
+    """
+    Write the artifact atomically so a running app never loads half a file.
+    With catalog=True the dataframe is written as a columnar catalog next to
+    the artifact instead of being pickled into it (see src/models/catalog.py).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if catalog:
+        model = split_catalog(model, path)
+    else:
+        model = {key: value for key, value in model.items() if key not in ('catalog', 'catalog_store')}
+    tmp_path = path + '.tmp'
+    joblib.dump(model, tmp_path, compress=compress)
+    os.replace(tmp_path, path)
+    print(f"Model saved to {path} ({os.path.getsize(path) / (1024 * 1024):.2f} MB)")
+    prune_catalogs(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the recommender model artifacts")
+    parser.add_argument('kind', choices=sorted(MODEL_CONFIGS) + ['all'], help="Which model to build")
+    parser.add_argument('--source', choices=['mongo', 'json'], default='mongo',
+                        help="Read detailed documents from MongoDB or a JSON export")
+    parser.add_argument('--input', help="JSON export to read with --source json (one kind only)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="Directory for the .joblib artifacts")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help="Neighbours kept per title")
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help="Rows per similarity block (bounds peak memory)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Worker processes for the similarity blocks (0 = one per CPU)")
+    parser.add_argument('--backend', choices=['matrix', 'features'], default='matrix',
+                        help="matrix: precomputed top-k cosine_sim; features: normalized TF-IDF rows scored per request")
+    parser.add_argument('--similarity-dtype', choices=SIMILARITY_DTYPES, default='float64',
+                        help="Storage precision of cosine_sim (see python -m src.models.quantize report)")
+    parser.add_argument('--embed-dataframe', action='store_true',
+                        help="Pickle the title dataframe into the artifact instead of writing a memory-mapped "
+                             "columnar catalog next to it")
+    parser.add_argument('--compress', type=int, default=3, help="joblib compression level (0 disables)")
+    args = parser.parse_args(argv)
+
+    kinds = sorted(MODEL_CONFIGS) if args.kind == 'all' else [args.kind]
+    if args.input and len(kinds) > 1:
+        parser.error("--input can only be used when building a single kind")
+
+    for kind in kinds:
+        print(f"\n==== Building {kind} model ====")
+        timer = StageTimer()
+        with timer.stage('load'):
+            documents = load_documents(kind, source=args.source, input_path=args.input)
+        print(f"Loaded {len(documents)} documents")
+
+        model = build_model(kind, documents, top_k=args.top_k, timer=timer,
+                            block_size=args.block_size, n_jobs=args.jobs, backend=args.backend,
+                            similarity_dtype=args.similarity_dtype)
+
+        with timer.stage('save'):
+            save_model(model, os.path.join(args.output_dir, MODEL_CONFIGS[kind]['artifact']),
+                       compress=args.compress, catalog=not args.embed_dataframe)
+        timer.report()
+
+
+if __name__ == '__main__':
+    main()
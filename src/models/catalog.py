@@ -0,0 +1,395 @@
+# src/models/catalog.py
+"""
+Columnar storage for the title catalog that travels with a model.
+
+Instead of pickling movies_df/series_df inside the joblib artifact, the
+catalog can be written to a directory of flat files:
+
+    meta.json                 column layout and genre vocabulary
+    <column>.npy              numeric columns, memory-mapped on load
+    <column>.offsets.npy      string columns: offsets into <column>.bytes
+    <column>.bytes            UTF-8 string pool
+    <column>.nulls.npy        which strings are missing
+    <column>.codes.npy        list columns (genre_names): integer codes into the vocabulary
+
+Opening a catalog only maps the files, and to_frame() materializes just the
+columns the web app serves. Numeric columns stay memory-mapped. With pyarrow
+(in requirements.txt), string columns are Arrow strings over the mapped files
+as well; without it they are decoded into Python str objects when the frame is
+built. Genre lists share one list object per distinct list. Artifacts that
+still embed their dataframe are put in the same shape on load (compact_frame),
+so a preforked worker serves from buffers that requests never write to.
+
+Every write goes to a new directory (catalog_dir_for), and the artifact is
+switched to it afterwards, so a rewrite never touches files a running worker
+has mapped. After the switch, prune_catalogs removes the directories no
+artifact references any more, except the newest of them: the previous
+catalog, which running workers may still have mapped and a rollback needs.
+Convert an existing artifact with:
+
+    python -m src.models.catalog models/movie_recommender.joblib
+"""
+import json
+import math
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import numpy as np
+
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+CATALOG_FORMAT_VERSION = 1
+
+# Dataframe key for each kind of artifact
+DF_KEYS = ('movies_df', 'series_df')
+
+# Columns the web routes read; the *_text feature columns are only needed
+# by the offline tools (ANN build, incremental update)
+SERVING_COLUMNS = ('id', 'title', 'name', 'genre_names', 'vote_average', 'popularity', 'poster_path',
+                   'overview', 'popularity_scaled', 'vote_average_scaled', 'vote_count_scaled')
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _column_kind(series):
+    """'numeric', 'string_list' or 'string' for a dataframe column"""
+    import pandas as pd
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return 'numeric'
+    if any(isinstance(value, (list, tuple)) for value in series if not _is_missing(value)):
+        return 'string_list'
+    return 'string'
+
+
+def _write_strings(directory, name, values):
+    encoded = [None if _is_missing(value) else str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) if value is not None else 0 for value in encoded])
+    np.save(os.path.join(directory, f'{name}.offsets.npy'), offsets)
+    np.save(os.path.join(directory, f'{name}.nulls.npy'), np.array([value is None for value in encoded], dtype=bool))
+    with open(os.path.join(directory, f'{name}.bytes'), 'wb') as f:
+        f.write(b''.join(value for value in encoded if value))
+
+
+def _write_string_lists(directory, name, values):
+    lists = [list(value) if isinstance(value, (list, tuple)) else [] for value in values]
+    vocabulary = sorted({str(item) for items in lists for item in items})
+    code_of = {item: code for code, item in enumerate(vocabulary)}
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(items) for items in lists])
+    code_dtype = np.int16 if len(vocabulary) < 2 ** 15 else np.int32
+    codes = np.array([code_of[str(item)] for items in lists for item in items], dtype=code_dtype)
+    np.save(os.path.join(directory, f'{name}.offsets.npy'), offsets)
+    np.save(os.path.join(directory, f'{name}.codes.npy'), codes)
+    return vocabulary
+
+
+def write_catalog(df, directory):
+    """Write a title dataframe as a columnar catalog directory"""
+    os.makedirs(directory, exist_ok=True)
+    meta = {'format_version': CATALOG_FORMAT_VERSION, 'n_rows': len(df), 'columns': {}}
+
+    for name in df.columns:
+        series = df[name]
+        kind = _column_kind(series)
+        spec = {'kind': kind}
+        if kind == 'numeric':
+            np.save(os.path.join(directory, f'{name}.npy'), series.to_numpy())
+        elif kind == 'string_list':
+            spec['vocabulary'] = _write_string_lists(directory, name, series.tolist())
+        else:
+            _write_strings(directory, name, series.tolist())
+        meta['columns'][name] = spec
+
+    # meta.json last: a directory without it is an incomplete write
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return directory
+
+
+class Catalog:
+    """Read-only, memory-mapped view of a catalog directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.columns = list(self.meta['columns'])
+        self._position_by_id = None
+
+    def __len__(self):
+        return self.meta['n_rows']
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self, name):
+        return np.load(self._path(name), mmap_mode='r')
+
+    def _string_pool(self, name):
+        path = self._path(f'{name}.bytes')
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode='r')
+
+    def numeric(self, name):
+        """Memory-mapped array for a numeric column"""
+        return self._load(f'{name}.npy')
+
+    def arrow_strings(self, name):
+        """
+        A string column as a pandas array of Arrow strings backed by the mapped
+        files (no per-value decoding), or None without pyarrow
+        """
+        if _arrow_string_dtype() is None:
+            return None
+        import pandas as pd
+        import pyarrow as pa
+        offsets = self._load(f'{name}.offsets.npy')
+        nulls = np.asarray(self._load(f'{name}.nulls.npy'))
+        validity = pa.py_buffer(np.packbits(~nulls, bitorder='little')) if nulls.any() else None
+        array = pa.LargeStringArray.from_buffers(len(nulls), pa.py_buffer(offsets),
+                                                 pa.py_buffer(self._string_pool(name)), validity)
+        return pd.arrays.ArrowExtensionArray(array)
+
+    def strings(self, name):
+        """Decoded values of a string column (None where missing)"""
+        offsets = self._load(f'{name}.offsets.npy')
+        nulls = self._load(f'{name}.nulls.npy')
+        pool = self._string_pool(name)
+        data = pool.tobytes()
+        return [None if nulls[i] else data[offsets[i]:offsets[i + 1]].decode('utf-8')
+                for i in range(len(nulls))]
+
+    def string_lists(self, name):
+        """Decoded values of a list column; identical lists share one list object"""
+        vocabulary = self.meta['columns'][name]['vocabulary']
+        offsets = self._load(f'{name}.offsets.npy')
+        codes = np.asarray(self._load(f'{name}.codes.npy'))
+        shared = {}
+        values = []
+        for i in range(len(offsets) - 1):
+            key = codes[offsets[i]:offsets[i + 1]].tobytes()
+            if key not in shared:
+                shared[key] = [vocabulary[code] for code in codes[offsets[i]:offsets[i + 1]]]
+            values.append(shared[key])
+        return values
+
+    def column(self, name):
+        kind = self.meta['columns'][name]['kind']
+        if kind == 'numeric':
+            return self.numeric(name)
+        if kind == 'string_list':
+            return self.string_lists(name)
+        return self.strings(name)
+
+    def position(self, title_id):
+        """Row position of a title id, or None"""
+        if self._position_by_id is None:
+            ids = np.asarray(self.numeric('id'))
+            order = np.argsort(ids, kind='stable')
+            self._position_by_id = (ids[order], order)
+        sorted_ids, order = self._position_by_id
+        try:
+            title_id = int(title_id)
+        except (TypeError, ValueError):
+            return None
+        i = np.searchsorted(sorted_ids, title_id)
+        if i < len(sorted_ids) and sorted_ids[i] == title_id:
+            return int(order[i])
+        return None
+
+    def to_frame(self, columns=None):
+        """DataFrame with the requested columns (all by default)"""
+        import pandas as pd
+        wanted = [name for name in self.columns if columns is None or name in columns]
+        data = {}
+        for name in wanted:
+            lazy = self.arrow_strings(name) if self.meta['columns'][name]['kind'] == 'string' else None
+            data[name] = lazy if lazy is not None else self.column(name)
+        return pd.DataFrame(data, copy=False)
+
+
+def catalog_dir_for(artifact_path):
+    """New, unique catalog directory name for an artifact, so a rewrite never touches a live catalog"""
+    stem = os.path.splitext(os.path.basename(artifact_path))[0]
+    return f"{stem}_catalog_{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}_{uuid.uuid4().hex[:8]}"
+
+
+def catalog_dirs(directory, artifact_path):
+    """Complete catalog directories written for an artifact, oldest first"""
+    prefix = os.path.splitext(os.path.basename(artifact_path))[0] + '_catalog_'
+    # Names carry the UTC write time, so they sort chronologically
+    return sorted(name for name in os.listdir(directory)
+                  if name.startswith(prefix) and not name.endswith('.tmp')
+                  and os.path.isdir(os.path.join(directory, name)))
+
+
+def artifact_catalog(path):
+    """Name of the catalog directory an artifact references, or None if it embeds its dataframe"""
+    import joblib
+    # Memory-mapped where possible: only the 'catalog' entry is needed
+    model = joblib.load(path, mmap_mode='r')
+    info = model.get('catalog') if isinstance(model, dict) else None
+    return info['directory'] if info else None
+
+
+def referenced_catalogs(directory):
+    """Catalog directories named by the artifacts (*.joblib, rollback copies included) in a directory"""
+    referenced = set()
+    for filename in os.listdir(directory):
+        if filename.endswith('.joblib'):
+            name = artifact_catalog(os.path.join(directory, filename))
+            if name:
+                referenced.add(name)
+    return referenced
+
+
+def prune_catalogs(artifact_path, keep_previous=1):
+    """
+    Remove the catalog directories of an artifact that no artifact references,
+    keeping the newest keep_previous of them for running workers and rollback.
+    Call it after the artifact has been replaced. Returns the removed names.
+    """
+    directory = os.path.dirname(os.path.abspath(artifact_path))
+    candidates = catalog_dirs(directory, artifact_path)
+    if len(candidates) <= keep_previous:
+        return []
+    try:
+        referenced = referenced_catalogs(directory)
+    except Exception as e:
+        # Without every reference, nothing is safe to delete
+        print(f"Not pruning old catalogs, an artifact in {directory} could not be read: {e}")
+        return []
+
+    unreferenced = [name for name in candidates if name not in referenced]
+    stale = unreferenced[:-keep_previous] if keep_previous else unreferenced
+    for name in stale:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        print(f"Removed unreferenced catalog {name}")
+    return stale
+
+
+def split_catalog(model, artifact_path):
+    """
+    Write the model's dataframe as a catalog next to artifact_path and return
+    a copy of the model that references it instead of embedding the dataframe.
+    """
+    df_key = next(key for key in DF_KEYS if key in model)
+    name = catalog_dir_for(artifact_path)
+    directory = os.path.join(os.path.dirname(os.path.abspath(artifact_path)), name)
+    # Written under a temporary name and renamed, so the directory is complete once it exists
+    tmp_directory = directory + '.tmp'
+    write_catalog(model[df_key], tmp_directory)
+    os.rename(tmp_directory, directory)
+
+    stripped = {key: value for key, value in model.items() if key not in (df_key, 'catalog_store')}
+    stripped['catalog'] = {'directory': name, 'df_key': df_key}
+    return stripped
+
+
+def attach_catalog(model, artifact_path, columns=SERVING_COLUMNS):
+    """Materialize the dataframe of a catalog-backed model (no-op for embedded dataframes)"""
+    info = model.get('catalog')
+    if not info or info['df_key'] in model:
+        return model
+    catalog = Catalog(os.path.join(os.path.dirname(os.path.abspath(artifact_path)), info['directory']))
+    model['catalog_store'] = catalog
+    model[info['df_key']] = catalog.to_frame(columns)
+    return model
+
+
+def detach_catalog(model):
+    """Copy of a catalog-backed model without the materialized dataframe, ready to dump again"""
+    info = model.get('catalog')
+    if not info:
+        return model
+    return {key: value for key, value in model.items() if key not in (info['df_key'], 'catalog_store')}
+
+
+def _arrow_string_dtype():
+    """pandas dtype for Arrow strings, or None without pyarrow"""
+    try:
+        import pandas as pd
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pd.ArrowDtype(pa.large_string()) if hasattr(pd, 'ArrowDtype') else None
+
+
+def compact_frame(df, columns=SERVING_COLUMNS):
+    """
+    The requested columns of an embedded dataframe in the layout to_frame()
+    gives a catalog: string columns as Arrow strings (with pyarrow) and one
+    shared list per distinct genre list, so no per-title Python objects remain
+    """
+    import pandas as pd
+    string_dtype = _arrow_string_dtype()
+    data = {}
+    for name in df.columns:
+        if columns is not None and name not in columns:
+            continue
+        series = df[name]
+        kind = _column_kind(series)
+        if kind == 'string' and string_dtype is not None:
+            values = [None if _is_missing(value) else str(value) for value in series.tolist()]
+            data[name] = pd.array(values, dtype=string_dtype)
+        elif kind == 'string_list':
+            shared = {}
+            data[name] = [shared.setdefault(tuple(value), list(value)) if isinstance(value, (list, tuple)) else value
+                          for value in series.tolist()]
+        else:
+            data[name] = series.to_numpy()
+    return pd.DataFrame(data, index=df.index, copy=False)
+
+
+def load_artifact(path, columns=SERVING_COLUMNS):
+    """
+    Load a recommender artifact, attaching its columnar catalog if it has one.
+    Pass columns=None to get every stored column and the feature rows
+    (offline tools need them). By default the dataframe is in serving shape:
+    an embedded one is compacted like a catalog, and the feature rows are
+    only kept for the 'features' backend, which serves from them.
+    """
+    import joblib
+    model = attach_catalog(joblib.load(path), path, columns=columns)
+    if columns is None:
+        return model
+    df_key = next((key for key in DF_KEYS if key in model), None)
+    if df_key and 'catalog' not in model:
+        model[df_key] = compact_frame(model[df_key], columns)
+    if model.get('similarity_backend', 'matrix') != 'features':
+        model.pop('feature_matrix', None)
+    return model
+
+
+def main(argv=None):
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Move an artifact's dataframe into a columnar catalog")
+    parser.add_argument('artifact', help="Path to movie_recommender.joblib or series_recommender.joblib")
+    parser.add_argument('--compress', type=int, default=3, help="joblib compression level (0 disables)")
+    args = parser.parse_args(argv)
+
+    model = joblib.load(args.artifact)
+    if 'catalog' in model:
+        print(f"{args.artifact} already uses a catalog")
+        return
+
+    stripped = split_catalog(model, args.artifact)
+    tmp_path = args.artifact + '.tmp'
+    joblib.dump(stripped, tmp_path, compress=args.compress)
+    os.replace(tmp_path, args.artifact)
+    print(f"Wrote catalog {stripped['catalog']['directory']} and updated {args.artifact}")
+    prune_catalogs(args.artifact)
+
+
+if __name__ == '__main__':
+    main()
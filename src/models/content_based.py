@@ -1,8 +1,116 @@
 # Modified functions in src/models/content_based.py
 
-import pandas as pd
 import numpy as np
 
+from src.instrumentation import timed
+from src.logs import get_logger
+
+logger = get_logger(__name__)
+
+# How a model artifact scores similarity, stored under model['similarity_backend']:
+#   'matrix'   - precomputed model['cosine_sim'] (dense or sparse top-k), the default
+#   'features' - model['feature_matrix'], the weighted L2-normalized TF-IDF rows;
+#                one similarity row is a sparse matrix-vector product per request
+#   'ann'      - model['ann_index'], an approximate nearest neighbour index
+#                (see src/models/ann.py) that only scores the probed candidates
+SIMILARITY_BACKENDS = ('matrix', 'features', 'ann')
+
+class FeatureSimilarity:
+    """On-demand cosine similarity over a weighted, L2-normalized CSR feature matrix"""
+
+    def __init__(self, feature_matrix):
+        self.feature_matrix = feature_matrix.tocsr()
+
+    def row(self, idx):
+        """Similarity of title idx to every title in the catalog"""
+        return self.score_vector(self.feature_matrix[idx])
+
+    def score_vector(self, vector):
+        """Similarity of an already normalized 1 x n_features row to every title"""
+        if hasattr(vector, 'toarray'):
+            vector = vector.toarray()
+        return self.feature_matrix @ np.asarray(vector, dtype=float).ravel()
+
+def get_similarity_source(model):
+    """Return the object the content-based functions read similarity rows from"""
+    backend = model.get('similarity_backend', 'matrix')
+    if backend == 'features':
+        return FeatureSimilarity(model['feature_matrix'])
+    if backend == 'ann':
+        return model['ann_index']
+    if backend == 'matrix':
+        return model['cosine_sim']
+    raise ValueError(f"Unknown similarity backend '{backend}'")
+
+def transform_documents(texts, model):
+    """
+    Weighted, L2-normalized feature rows for titles that are not in the model.
+    texts is a list of dicts keyed by text column ('title_text', 'genre_text', ...).
+    """
+    from scipy.sparse import hstack
+    from sklearn.preprocessing import normalize
+
+    blocks = []
+    # Vectorizers are stored in the same order the feature matrix was stacked in
+    for name, vectorizer in model['tfidf_vectorizers'].items():
+        weight = model['feature_weights'].get(f'{name}_weight', 1.0)
+        column = [text.get(f'{name}_text', '') or '' for text in texts]
+        blocks.append(weight * vectorizer.transform(column))
+    return normalize(hstack(blocks, format='csr'), norm='l2', axis=1)
+
+def catalog_feature_matrix(model):
+    """
+    Weighted, L2-normalized feature rows for every title in the model.
+    Artifacts built before every backend stored them get them recomputed from
+    the saved text columns with the saved vectorizers.
+    """
+    if model.get('feature_matrix') is not None:
+        return model['feature_matrix']
+    df = model['movies_df'] if 'movies_df' in model else model['series_df']
+    columns = [f'{name}_text' for name in model['tfidf_vectorizers']]
+    return transform_documents(df[columns].fillna('').to_dict('records'), model)
+
+def score_new_title(text, model):
+    """Similarity of a new title (dict of text columns) to every title in the catalog"""
+    if model.get('similarity_backend', 'matrix') != 'features':
+        raise ValueError("Scoring new titles needs a model built with the 'features' backend")
+    return FeatureSimilarity(model['feature_matrix']).score_vector(transform_documents([text], model))
+
+def _similarity_row(cosine_sim, idx):
+    """Similarity scores of row idx as a flat float array"""
+    if hasattr(cosine_sim, 'row'):
+        return np.array(cosine_sim.row(idx), dtype=float).ravel()
+    row = cosine_sim[idx]
+    if hasattr(row, 'toarray'):
+        row = row.toarray()
+    return np.array(row, dtype=float).ravel()
+
+def _top_indices(scores, n):
+    """
+    Positions of the n highest finite scores, highest first.
+    Ties keep catalog order, matching a stable sort of the whole row.
+    """
+    if n <= 0:
+        return np.array([], dtype=int)
+    finite = np.isfinite(scores)
+    if n >= int(finite.sum()):
+        order = np.argsort(-scores, kind='stable')
+        return order[finite[order]]
+    threshold = scores[np.argpartition(-scores, n - 1)[:n]].min()
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[:n - above.size]
+    chosen = np.concatenate([above, ties])
+    return chosen[np.argsort(-scores[chosen], kind='stable')]
+
+def _rank_similar(cosine_sim, idx, exclude_mask, top_n):
+    """List of (position, similarity) for the top_n titles most similar to position idx"""
+    scores = _similarity_row(cosine_sim, idx)
+    scores[idx] = -np.inf
+    scores[exclude_mask] = -np.inf
+    top = _top_indices(scores, top_n)
+    return [(int(i), float(scores[i])) for i in top]
+
+@timed('similarity')
 def get_content_based_movie_recommendations_by_id(movie_id, cosine_sim, df, top_n=12):
     """Get movie recommendations based on ID rather than title"""
     try:
@@ -14,33 +122,18 @@ def get_content_based_movie_recommendations_by_id(movie_id, cosine_sim, df, top_
             movie_row = df[df['id'].astype(str) == str(movie_id)]
             
         if movie_row.empty:
-            print(f"Movie with ID '{movie_id}' not found")
+            logger.info("Movie with ID '%s' not found", movie_id)
             return []
             
         # Get the index of the movie
         idx = movie_row.index[0]  # Get the first index from the result
-        title = movie_row.iloc[0]['title']  # Get the title for logging
-        
-        print(f"Found movie '{title}' at index {idx}")
-        
-        # Get similarity scores for all movies
-        sim_scores = []
-        for i in range(len(df)):
-            # Skip the exact same movie and any duplicate titles
-            if i == idx or df.iloc[i]['id'] == movie_id:
-                continue
-                
-            # Handle case where similarity value might be an array
-            sim_value = cosine_sim[idx, i]
-            if hasattr(sim_value, '__len__') and len(sim_value) > 0:
-                sim_value = float(sim_value[0])
-            sim_scores.append((i, float(sim_value)))
         
-        # Sort based on similarity scores
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
+        if __debug__:
+            logger.debug("Found movie '%s' at index %s", movie_row.iloc[0]['title'], idx)
         
-        # Get top N most similar movies
-        sim_scores = sim_scores[:top_n]
+        # Get the top N most similar movies, skipping the exact same movie and any duplicate titles
+        idx = df.index.get_loc(idx)
+        sim_scores = _rank_similar(cosine_sim, idx, (df['id'] == movie_id).to_numpy(), top_n)
         
         # Get movie indices
         movie_indices = [i[0] for i in sim_scores]
@@ -52,9 +145,10 @@ def get_content_based_movie_recommendations_by_id(movie_id, cosine_sim, df, top_
         
         return result
     except Exception as e:
-        print(f"Error in get_content_based_movie_recommendations_by_id: {e}")
+        logger.error("Error in get_content_based_movie_recommendations_by_id: %s", e)
         return []
 
+@timed('similarity')
 def get_content_based_series_recommendations_by_id(series_id, cosine_sim, df, top_n=12):
     """Get series recommendations based on ID rather than title"""
     try:
@@ -66,33 +160,18 @@ def get_content_based_series_recommendations_by_id(series_id, cosine_sim, df, to
             series_row = df[df['id'].astype(str) == str(series_id)]
             
         if series_row.empty:
-            print(f"Series with ID '{series_id}' not found")
+            logger.info("Series with ID '%s' not found", series_id)
             return []
             
         # Get the index of the series
         idx = series_row.index[0]  # Get the first index from the result
-        name = series_row.iloc[0]['name']  # Get the name for logging
-        
-        print(f"Found series '{name}' at index {idx}")
-        
-        # Get similarity scores for all series
-        sim_scores = []
-        for i in range(len(df)):
-            # Skip the exact same series and any duplicate names
-            if i == idx or df.iloc[i]['id'] == series_id:
-                continue
-                
-            # Handle case where similarity value might be an array
-            sim_value = cosine_sim[idx, i]
-            if hasattr(sim_value, '__len__') and len(sim_value) > 0:
-                sim_value = float(sim_value[0])
-            sim_scores.append((i, float(sim_value)))
         
-        # Sort based on similarity scores
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
+        if __debug__:
+            logger.debug("Found series '%s' at index %s", series_row.iloc[0]['name'], idx)
         
-        # Get top N most similar series
-        sim_scores = sim_scores[:top_n]
+        # Get the top N most similar series, skipping the exact same series and any duplicate names
+        idx = df.index.get_loc(idx)
+        sim_scores = _rank_similar(cosine_sim, idx, (df['id'] == series_id).to_numpy(), top_n)
         
         # Get series indices
         series_indices = [i[0] for i in sim_scores]
@@ -104,20 +183,21 @@ def get_content_based_series_recommendations_by_id(series_id, cosine_sim, df, to
         
         return result
     except Exception as e:
-        print(f"Error in get_content_based_series_recommendations_by_id: {e}")
+        logger.error("Error in get_content_based_series_recommendations_by_id: %s", e)
         return []
 
+@timed('hybrid')
 def get_hybrid_movie_recommendations_by_id(movie_id, model, top_n=12):
     """Get hybrid movie recommendations using ID instead of title"""
     # Extract components from the model
-    cosine_sim = model['cosine_sim']
+    cosine_sim = get_similarity_source(model)
     movies_df = model['movies_df']
     
     # Get content-based recommendations first
     content_recs = get_content_based_movie_recommendations_by_id(movie_id, cosine_sim, movies_df, top_n=top_n*3)
     
     if len(content_recs) == 0:
-        print(f"No content-based recommendations found for movie ID '{movie_id}'")
+        logger.info("No content-based recommendations found for movie ID '%s'", movie_id)
         return []
     
     try:
@@ -126,12 +206,11 @@ def get_hybrid_movie_recommendations_by_id(movie_id, model, top_n=12):
         if movie_row.empty:
             movie_row = movies_df[movies_df['id'].astype(str) == str(movie_id)]
         if movie_row.empty:
-            print(f"Movie with ID '{movie_id}' not found")
+            logger.info("Movie with ID '%s' not found", movie_id)
             return []
             
         # Get the index of the movie
         movie_idx = movie_row.index[0]
-        title = movie_row.iloc[0]['title']  # Get title for logging
         
         # Get the original indices from content_recs
         original_indices = content_recs.index
@@ -194,20 +273,21 @@ def get_hybrid_movie_recommendations_by_id(movie_id, model, top_n=12):
         
         return result
     except Exception as e:
-        print(f"Error in get_hybrid_movie_recommendations_by_id: {e}")
+        logger.error("Error in get_hybrid_movie_recommendations_by_id: %s", e)
         return []
 
+@timed('hybrid')
 def get_hybrid_series_recommendations_by_id(series_id, model, top_n=12):
     """Get hybrid series recommendations using ID instead of title"""
     # Extract components from the model
-    cosine_sim = model['cosine_sim']
+    cosine_sim = get_similarity_source(model)
     series_df = model['series_df']
     
     # Get content-based recommendations first
     content_recs = get_content_based_series_recommendations_by_id(series_id, cosine_sim, series_df, top_n=top_n*3)
     
     if len(content_recs) == 0:
-        print(f"No content-based recommendations found for series ID '{series_id}'")
+        logger.info("No content-based recommendations found for series ID '%s'", series_id)
         return []
     
     try:
@@ -216,12 +296,11 @@ def get_hybrid_series_recommendations_by_id(series_id, model, top_n=12):
         if series_row.empty:
             series_row = series_df[series_df['id'].astype(str) == str(series_id)]
         if series_row.empty:
-            print(f"Series with ID '{series_id}' not found")
+            logger.info("Series with ID '%s' not found", series_id)
             return []
             
         # Get the index of the series
         series_idx = series_row.index[0]
-        name = series_row.iloc[0]['name']  # Get name for logging
         
         # Get the original indices from content_recs
         original_indices = content_recs.index
@@ -288,9 +367,17 @@ def get_hybrid_series_recommendations_by_id(series_id, model, top_n=12):
         
         return result
     except Exception as e:
-        print(f"Error in get_hybrid_series_recommendations_by_id: {e}")
+        logger.error("Error in get_hybrid_series_recommendations_by_id: %s", e)
         return []
 
+def search_titles(df, query, title_field='title'):
+    """Rows whose title contains the (lower-case) query, or that have a genre containing it"""
+    title_mask = df[title_field].str.lower().str.contains(query, case=False, na=False)
+    genre_mask = df['genre_names'].apply(
+        lambda genres: any(query in genre.lower() for genre in genres) if isinstance(genres, list) else False
+    )
+    return df[title_mask | genre_mask]
+
 # New simplified wrapper functions that use the hybrid approach by default and work with IDs
 def get_movie_recommendations_by_id(movie_id, model, top_n=10):
     """Get movie recommendations using the hybrid approach with movie ID"""
@@ -305,7 +392,7 @@ def get_content_based_movie_recommendations(title, cosine_sim, df, indices, top_
     """Get movie recommendations based purely on content similarity"""
     # Check if movie exists
     if title not in indices:
-        print(f"Movie '{title}' not found in indices")
+        logger.info("Movie '%s' not found in indices", title)
         return []
     
     try:
@@ -313,30 +400,15 @@ def get_content_based_movie_recommendations(title, cosine_sim, df, indices, top_
         movie_rows = df[df['title'] == title]
         
         if movie_rows.empty:
-            print(f"Movie '{title}' not found in dataframe")
+            logger.info("Movie '%s' not found in dataframe", title)
             return []
             
         # Use the first movie with this title
         idx = movie_rows.index[0]
         
-        # Get similarity scores for all movies
-        sim_scores = []
-        for i in range(len(df)):
-            # Skip the exact same movie and any duplicate titles
-            if i == idx or df.iloc[i]['title'] == title:
-                continue
-                
-            # Handle case where similarity value might be an array
-            sim_value = cosine_sim[idx, i]
-            if hasattr(sim_value, '__len__') and len(sim_value) > 0:
-                sim_value = float(sim_value[0])
-            sim_scores.append((i, float(sim_value)))
-        
-        # Sort based on similarity scores
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        
-        # Get top N most similar movies
-        sim_scores = sim_scores[:top_n]
+        # Get the top N most similar movies, skipping the exact same movie and any duplicate titles
+        idx = df.index.get_loc(idx)
+        sim_scores = _rank_similar(cosine_sim, idx, (df['title'] == title).to_numpy(), top_n)
         
         # Get movie indices
         movie_indices = [i[0] for i in sim_scores]
@@ -348,14 +420,14 @@ def get_content_based_movie_recommendations(title, cosine_sim, df, indices, top_
         
         return result
     except Exception as e:
-        print(f"Error in get_content_based_movie_recommendations: {e}")
+        logger.error("Error in get_content_based_movie_recommendations: %s", e)
         return []
 
 def get_content_based_series_recommendations(name, cosine_sim, df, indices, top_n=12):
     """Get series recommendations based purely on content similarity"""
     # Check if series exists
     if name not in indices:
-        print(f"Series '{name}' not found in indices")
+        logger.info("Series '%s' not found in indices", name)
         return []
     
     try:
@@ -363,30 +435,15 @@ def get_content_based_series_recommendations(name, cosine_sim, df, indices, top_
         series_rows = df[df['name'] == name]
         
         if series_rows.empty:
-            print(f"Series '{name}' not found in dataframe")
+            logger.info("Series '%s' not found in dataframe", name)
             return []
             
         # Use the first series with this name
         idx = series_rows.index[0]
         
-        # Get similarity scores for all series
-        sim_scores = []
-        for i in range(len(df)):
-            # Skip the exact same series and any duplicate names
-            if i == idx or df.iloc[i]['name'] == name:
-                continue
-                
-            # Handle case where similarity value might be an array
-            sim_value = cosine_sim[idx, i]
-            if hasattr(sim_value, '__len__') and len(sim_value) > 0:
-                sim_value = float(sim_value[0])
-            sim_scores.append((i, float(sim_value)))
-        
-        # Sort based on similarity scores
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        
-        # Get top N most similar series
-        sim_scores = sim_scores[:top_n]
+        # Get the top N most similar series, skipping the exact same series and any duplicate names
+        idx = df.index.get_loc(idx)
+        sim_scores = _rank_similar(cosine_sim, idx, (df['name'] == name).to_numpy(), top_n)
         
         # Get series indices
         series_indices = [i[0] for i in sim_scores]
@@ -398,14 +455,14 @@ def get_content_based_series_recommendations(name, cosine_sim, df, indices, top_
         
         return result
     except Exception as e:
-        print(f"Error in get_content_based_series_recommendations: {e}")
+        logger.error("Error in get_content_based_series_recommendations: %s", e)
         return []
 
 # Original hybrid functions with title-based lookup for backward compatibility
 def get_hybrid_movie_recommendations(title, model, top_n=12):
     """Get hybrid movie recommendations combining content similarity with popularity and ratings"""
     # Extract components from the model
-    cosine_sim = model['cosine_sim']
+    cosine_sim = get_similarity_source(model)
     indices = model['indices']
     movies_df = model['movies_df']
     
@@ -413,7 +470,7 @@ def get_hybrid_movie_recommendations(title, model, top_n=12):
     content_recs = get_content_based_movie_recommendations(title, cosine_sim, movies_df, indices, top_n=top_n*3)
     
     if len(content_recs) == 0:
-        print(f"No content-based recommendations found for '{title}'")
+        logger.info("No content-based recommendations found for '%s'", title)
         return []
     
     # Rest of the function stays the same...
@@ -425,7 +482,7 @@ def get_hybrid_movie_recommendations(title, model, top_n=12):
         # Find the movie by title (may encounter issues with duplicates)
         movie_rows = movies_df[movies_df['title'] == title]
         if movie_rows.empty:
-            print(f"Movie with title '{title}' not found")
+            logger.info("Movie with title '%s' not found", title)
             return []
             
         # Use the first movie with this title 
@@ -440,13 +497,13 @@ def get_hybrid_movie_recommendations(title, model, top_n=12):
         return get_hybrid_movie_recommendations_by_id(movie_id, model, top_n)
         
     except Exception as e:
-        print(f"Error in get_hybrid_movie_recommendations: {e}")
+        logger.error("Error in get_hybrid_movie_recommendations: %s", e)
         return []
 
 def get_hybrid_series_recommendations(name, model, top_n=12):
     """Get hybrid series recommendations combining content similarity with popularity and ratings"""
     # Extract components from the model
-    cosine_sim = model['cosine_sim']
+    cosine_sim = get_similarity_source(model)
     indices = model['indices']
     series_df = model['series_df']
     
@@ -454,7 +511,7 @@ def get_hybrid_series_recommendations(name, model, top_n=12):
     content_recs = get_content_based_series_recommendations(name, cosine_sim, series_df, indices, top_n=top_n*3)
     
     if len(content_recs) == 0:
-        print(f"No content-based recommendations found for '{name}'")
+        logger.info("No content-based recommendations found for '%s'", name)
         return []
     
     # Rest of the function stays the same...
@@ -466,7 +523,7 @@ def get_hybrid_series_recommendations(name, model, top_n=12):
         # Find the series by name (may encounter issues with duplicates)
         series_rows = series_df[series_df['name'] == name]
         if series_rows.empty:
-            print(f"Series with name '{name}' not found")
+            logger.info("Series with name '%s' not found", name)
             return []
             
         # Use the first series with this name
@@ -481,7 +538,7 @@ def get_hybrid_series_recommendations(name, model, top_n=12):
         return get_hybrid_series_recommendations_by_id(series_id, model, top_n)
         
     except Exception as e:
-        print(f"Error in get_hybrid_series_recommendations: {e}")
+        logger.error("Error in get_hybrid_series_recommendations: %s", e)
         return []
 
 # Keep the original wrapper functions for backward compatibility
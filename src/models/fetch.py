@@ -0,0 +1,376 @@
+# src/models/fetch.py
+"""
+Download model artifacts from object storage into a local cache.
+
+The bucket holds the artifacts (and their catalog directories) next to a
+manifest.json with the sha256 and size of every file, and the catalog
+directory each artifact references. Only live artifacts are published:
+rollback copies (<name>.v<N>.joblib) and catalog directories no artifact
+references stay local. A sync reads the manifest, skips files whose cached
+copy already has that hash, and fetches the rest with parallel ranged GETs,
+verifying each checksum before the file replaces the cached one:
+
+    python -m src.models.fetch sync --store s3://imdb-recommender-models --dest models
+    python -m src.models.fetch publish models --store s3://imdb-recommender-models
+
+--endpoint (or MODEL_STORE_ENDPOINT) points the S3 client at any
+S3-compatible server, e.g. a local MinIO. A plain directory also works as a
+store, which is handy for testing.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+MANIFEST_NAME = 'manifest.json'
+
+# What the cache last verified, kept inside the model directory
+LOCAL_STATE_NAME = '.manifest.local.json'
+
+# Files larger than one part are fetched as parallel ranged GETs
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+DEFAULT_WORKERS = 8
+
+_HASH_CHUNK = 4 * 1024 * 1024
+
+# Rollback copies written by src.models.update, never published
+_ROLLBACK_COPY = re.compile(r'\.v\d+\.joblib$')
+
+# Catalog directories are named <artifact stem>_catalog_<time>_<id> (src/models/catalog.py)
+_CATALOG_MARKER = '_catalog_'
+
+# Serializes updates of the local state file between threads of one process
+_state_lock = threading.Lock()
+
+
+class ChecksumError(Exception):
+    """A downloaded file does not match the manifest"""
+
+
+class S3Store:
+    """Objects under a prefix of an S3 (or S3-compatible) bucket"""
+
+    def __init__(self, bucket, prefix='', endpoint_url=None):
+        import boto3
+        from botocore.config import Config
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url,
+                                   config=Config(max_pool_connections=max(DEFAULT_WORKERS, 10)))
+
+    def _key(self, name):
+        return f'{self.prefix}/{name}' if self.prefix else name
+
+    def read(self, name):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body'].read()
+
+    def read_range(self, name, start, stop):
+        """Bytes [start, stop) of an object"""
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(name),
+                                          Range=f'bytes={start}-{stop - 1}')
+        return response['Body'].read()
+
+    def write(self, name, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=data)
+
+    def upload(self, name, path):
+        self.client.upload_file(path, self.bucket, self._key(name))
+
+    def __repr__(self):
+        return f's3://{self.bucket}/{self.prefix}'
+
+
+class DirectoryStore:
+    """A local directory laid out like the bucket"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def read(self, name):
+        with open(self._path(name), 'rb') as f:
+            return f.read()
+
+    def read_range(self, name, start, stop):
+        with open(self._path(name), 'rb') as f:
+            f.seek(start)
+            return f.read(stop - start)
+
+    def write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def upload(self, name, path):
+        with open(path, 'rb') as f:
+            self.write(name, f.read())
+
+    def __repr__(self):
+        return self.root
+
+
+def open_store(url, endpoint_url=None):
+    """Store for an s3://bucket/prefix URL or a local directory"""
+    if url.startswith('s3://'):
+        bucket, _, prefix = url[len('s3://'):].partition('/')
+        return S3Store(bucket, prefix, endpoint_url=endpoint_url or os.getenv('MODEL_STORE_ENDPOINT'))
+    return DirectoryStore(url)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_partial(root, filename):
+    """Partial writes, including catalog directories still being written"""
+    return filename.endswith('.tmp') or '.part-' in filename or root.endswith('.tmp')
+
+
+def build_manifest(directory):
+    """
+    Manifest entries for the live artifacts under a local model directory:
+    every artifact except rollback copies, the catalog directory each one
+    references, and any other file in the directory
+    """
+    from src.models.catalog import artifact_catalog
+
+    artifacts = {}
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.endswith('.joblib') and not _ROLLBACK_COPY.search(filename) and os.path.isfile(path):
+            artifacts[filename] = {'catalog': artifact_catalog(path)}
+    catalogs = {entry['catalog'] for entry in artifacts.values() if entry['catalog']}
+
+    files = {}
+    for root, _, names in os.walk(directory):
+        for filename in names:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, directory).replace(os.sep, '/')
+            if filename in (MANIFEST_NAME, LOCAL_STATE_NAME) or _is_partial(root, filename):
+                continue
+            if _ROLLBACK_COPY.search(filename):
+                continue
+            top = name.split('/')[0]
+            if '/' in name and _CATALOG_MARKER in top and top not in catalogs:
+                # A catalog only an older artifact used
+                continue
+            files[name] = {'sha256': file_sha256(path), 'size': os.path.getsize(path)}
+    return {'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'artifacts': artifacts, 'files': files}
+
+
+def read_manifest(store):
+    return json.loads(store.read(MANIFEST_NAME).decode('utf-8'))
+
+
+def artifact_files(manifest, artifact):
+    """The artifact and the files of the catalog directory it references"""
+    if 'artifacts' not in manifest:
+        # Manifests published before artifact entries: every catalog of the artifact
+        catalog_prefix = os.path.splitext(artifact)[0] + _CATALOG_MARKER
+        return [name for name in manifest['files'] if name == artifact or name.startswith(catalog_prefix)]
+    if artifact not in manifest['artifacts']:
+        return []
+    catalog = manifest['artifacts'][artifact]['catalog']
+    prefix = f'{catalog}/' if catalog else None
+    return [name for name in manifest['files'] if name == artifact or (prefix and name.startswith(prefix))]
+
+
+def _load_state(dest):
+    try:
+        with open(os.path.join(dest, LOCAL_STATE_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _record_state(dest, updates):
+    """Merge verified entries into the local state file"""
+    with _state_lock:
+        state = _load_state(dest)
+        state.update(updates)
+        tmp_path = os.path.join(dest, f'{LOCAL_STATE_NAME}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_path, os.path.join(dest, LOCAL_STATE_NAME))
+
+
+def is_cached(dest, name, entry, state):
+    """
+    True if the local copy of name matches the manifest entry. A file whose
+    size and mtime are unchanged since it was last verified is trusted
+    without hashing it again.
+    """
+    path = os.path.join(dest, *name.split('/'))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != entry['size']:
+        return False
+    known = state.get(name)
+    if known and known['sha256'] == entry['sha256'] and known.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    return file_sha256(path) == entry['sha256']
+
+
+def download_file(store, name, entry, path, part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+    """Fetch one object in parallel ranges, verify it and move it into place"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.part-{os.getpid()}-{threading.get_ident()}'
+    size = entry['size']
+    ranges = [(start, min(start + part_size, size)) for start in range(0, size, part_size)]
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.truncate(size)
+
+        def fetch(byte_range):
+            start, stop = byte_range
+            data = store.read_range(name, start, stop)
+            if len(data) != stop - start:
+                raise ChecksumError(f"{name}: expected {stop - start} bytes at {start}, got {len(data)}")
+            # Each part writes through its own handle into the preallocated file
+            with open(tmp_path, 'r+b') as part:
+                part.seek(start)
+                part.write(data)
+
+        if len(ranges) > 1 and workers > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+                list(pool.map(fetch, ranges))
+        else:
+            for byte_range in ranges:
+                fetch(byte_range)
+
+        digest = file_sha256(tmp_path)
+        if digest != entry['sha256']:
+            raise ChecksumError(f"{name}: sha256 {digest} does not match the manifest ({entry['sha256']})")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def sync_models(store, dest, names=None, manifest=None, part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+    """
+    Bring dest up to date with the store for the given manifest entries (all by
+    default). Returns the names that were downloaded.
+    """
+    manifest = manifest or read_manifest(store)
+    names = list(manifest['files']) if names is None else names
+    os.makedirs(dest, exist_ok=True)
+    state = _load_state(dest)
+
+    downloaded = []
+    verified = {}
+    for name in names:
+        entry = manifest['files'][name]
+        path = os.path.join(dest, *name.split('/'))
+        if is_cached(dest, name, entry, state):
+            print(f"{name} is up to date")
+        else:
+            start = time.perf_counter()
+            download_file(store, name, entry, path, part_size=part_size, workers=workers)
+            print(f"Downloaded {name} ({entry['size'] / (1024 * 1024):.2f} MB) "
+                  f"in {time.perf_counter() - start:.2f}s")
+            downloaded.append(name)
+        verified[name] = {'sha256': entry['sha256'], 'mtime_ns': os.stat(path).st_mtime_ns}
+
+    _record_state(dest, verified)
+    return downloaded
+
+
+def fetch_artifact(store_url, dest, artifact, endpoint_url=None):
+    """Make sure one artifact and its catalog are cached in dest (used by the web app)"""
+    store = open_store(store_url, endpoint_url=endpoint_url)
+    manifest = read_manifest(store)
+    names = artifact_files(manifest, artifact)
+    if not names:
+        print(f"{artifact} is not listed in the manifest of {store}")
+        return []
+    downloaded = sync_models(store, dest, names=names, manifest=manifest)
+    prune_cached_catalogs(dest, manifest, [artifact])
+    return downloaded
+
+
+def prune_cached_catalogs(dest, manifest, artifacts):
+    """Drop cached catalogs the synced artifacts replaced (the previous one is kept)"""
+    from src.models.catalog import prune_catalogs
+    for artifact in artifacts:
+        if artifact in manifest.get('artifacts', {}):
+            prune_catalogs(os.path.join(dest, artifact))
+
+
+def publish_models(directory, store):
+    """Upload changed files from a local model directory, then the manifest"""
+    manifest = build_manifest(directory)
+    try:
+        remote = read_manifest(store)['files']
+    except Exception:
+        remote = {}
+
+    for name, entry in manifest['files'].items():
+        if remote.get(name, {}).get('sha256') == entry['sha256']:
+            continue
+        print(f"Uploading {name} ({entry['size'] / (1024 * 1024):.2f} MB)")
+        store.upload(name, os.path.join(directory, *name.split('/')))
+
+    # The manifest goes last so readers never see hashes for files not yet uploaded
+    store.write(MANIFEST_NAME, json.dumps(manifest, indent=1).encode('utf-8'))
+    print(f"Published {len(manifest['files'])} files to {store}")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync model artifacts with object storage")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sync = subparsers.add_parser('sync', help="Download changed artifacts into a local directory")
+    sync.add_argument('--store', default=os.getenv('MODEL_STORE_URL'), help="s3://bucket/prefix or a directory")
+    sync.add_argument('--dest', default='models', help="Local model directory")
+    sync.add_argument('--only', nargs='*', help="Artifacts to fetch (default: everything in the manifest)")
+    sync.add_argument('--part-size', type=int, default=DEFAULT_PART_SIZE, help="Bytes per ranged GET")
+    sync.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Parallel ranged GETs per file")
+
+    publish = subparsers.add_parser('publish', help="Upload a model directory and its manifest")
+    publish.add_argument('directory')
+    publish.add_argument('--store', default=os.getenv('MODEL_STORE_URL'), help="s3://bucket/prefix or a directory")
+
+    for subparser in (sync, publish):
+        subparser.add_argument('--endpoint', default=None, help="S3-compatible endpoint URL")
+
+    args = parser.parse_args(argv)
+    if not args.store:
+        parser.error("--store or MODEL_STORE_URL is required")
+    store = open_store(args.store, endpoint_url=args.endpoint)
+
+    if args.command == 'publish':
+        publish_models(args.directory, store)
+        return
+
+    manifest = read_manifest(store)
+    names = None
+    if args.only:
+        names = [name for artifact in args.only for name in artifact_files(manifest, artifact)]
+    downloaded = sync_models(store, args.dest, names=names, manifest=manifest,
+                             part_size=args.part_size, workers=args.workers)
+    prune_cached_catalogs(args.dest, manifest, args.only or list(manifest.get('artifacts', {})))
+    print(f"{len(downloaded)} files downloaded")
+
+
+if __name__ == '__main__':
+    main()
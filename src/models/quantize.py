@@ -0,0 +1,219 @@
+# src/models/quantize.py
+"""
+Reduced-precision storage for the cosine_sim similarity data.
+
+Ranking only needs the order of the scores, so the float64 values in the
+artifacts can be stored as float32, float16 or uint8 with a per-row scale.
+The report compares each format with the float64 reference on sampled rows:
+
+    python -m src.models.quantize report models/movie_recommender.joblib
+    python -m src.models.quantize convert models/movie_recommender.joblib --dtype uint8
+
+Quantized matrices expose row(idx) like FeatureSimilarity, so the
+content-based functions serve them without changes.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.models.content_based import _similarity_row, _top_indices
+
+SIMILARITY_DTYPES = ('float64', 'float32', 'float16', 'uint8')
+
+
+def _quantize_rows(values, row_of_value, n_rows):
+    """uint8 codes and per-row scales for non-negative values"""
+    scales = np.zeros(n_rows, dtype=np.float32)
+    if values.size:
+        np.maximum.at(scales, row_of_value, values.astype(np.float32))
+    safe = np.where(scales > 0, scales, 1.0)
+    codes = np.rint(values / safe[row_of_value] * 255)
+    # Stored neighbours must stay non-zero so they still rank above missing ones
+    codes = np.clip(codes, 1, 255).astype(np.uint8)
+    return codes, scales
+
+
+class QuantizedSimilarity:
+    """Top-k sparse similarity (CSR layout) with float16 or uint8 values"""
+
+    def __init__(self, matrix, dtype):
+        matrix = matrix.tocsr()
+        self.shape = matrix.shape
+        self.dtype = dtype
+        self.indptr = matrix.indptr.astype(np.int64)
+        self.indices = matrix.indices.astype(np.int32)
+        if dtype == 'uint8':
+            row_of_value = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+            self.values, self.scales = _quantize_rows(matrix.data, row_of_value, self.shape[0])
+        else:
+            self.values = matrix.data.astype(dtype)
+            self.scales = None
+
+    @property
+    def nbytes(self):
+        scales = self.scales.nbytes if self.scales is not None else 0
+        return self.indptr.nbytes + self.indices.nbytes + self.values.nbytes + scales
+
+    def tocsr(self):
+        """Dequantized float64 CSR copy (used by the incremental update)"""
+        from scipy.sparse import csr_matrix
+        values = self.values.astype(np.float64)
+        if self.scales is not None:
+            values *= np.repeat(self.scales / 255.0, np.diff(self.indptr))
+        return csr_matrix((values, self.indices, self.indptr), shape=self.shape)
+
+    def row(self, idx):
+        start, stop = self.indptr[idx], self.indptr[idx + 1]
+        scores = np.zeros(self.shape[1])
+        values = self.values[start:stop].astype(float)
+        if self.scales is not None:
+            values *= self.scales[idx] / 255.0
+        scores[self.indices[start:stop]] = values
+        return scores
+
+
+class QuantizedDenseSimilarity:
+    """Dense N x N similarity stored as uint8 with a per-row scale"""
+
+    def __init__(self, matrix):
+        matrix = np.asarray(matrix)
+        self.shape = matrix.shape
+        self.dtype = 'uint8'
+        self.scales = np.abs(matrix).max(axis=1).astype(np.float32)
+        safe = np.where(self.scales > 0, self.scales, 1.0)
+        # Negative similarities carry no ranking value for recommendations
+        self.values = np.rint(np.clip(matrix, 0, None) / safe[:, None] * 255).astype(np.uint8)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.scales.nbytes
+
+    def row(self, idx):
+        return self.values[idx].astype(float) * (self.scales[idx] / 255.0)
+
+
+def quantize_similarity(similarity, dtype):
+    """Convert a dense or sparse similarity matrix to the requested storage format"""
+    if dtype not in SIMILARITY_DTYPES:
+        raise ValueError(f"Unsupported similarity dtype '{dtype}'")
+    if dtype == 'float64':
+        return similarity
+
+    if hasattr(similarity, 'tocsr'):
+        if dtype == 'float32':
+            return similarity.tocsr().astype(np.float32)
+        # scipy sparse matrices can't hold float16, so keep the raw CSR arrays
+        return QuantizedSimilarity(similarity, dtype)
+
+    if dtype == 'uint8':
+        return QuantizedDenseSimilarity(similarity)
+    return np.asarray(similarity).astype(dtype)
+
+
+def similarity_nbytes(similarity):
+    """Bytes held by a similarity matrix in any supported format"""
+    if hasattr(similarity, 'indptr') and hasattr(similarity, 'data'):
+        return similarity.data.nbytes + similarity.indices.nbytes + similarity.indptr.nbytes
+    return int(similarity.nbytes)
+
+
+def _kendall_tau(a, b):
+    from scipy.stats import kendalltau
+    tau = kendalltau(a, b).correlation
+    # Constant inputs (e.g. all ties after quantization) have no defined tau
+    return 1.0 if np.isnan(tau) else float(tau)
+
+
+def ranking_agreement(reference, candidate, k=9, n_queries=500, random_state=0):
+    """
+    Mean top-k overlap and Kendall tau of candidate against reference,
+    over the union of both top-k lists for sampled rows.
+    """
+    n_rows = reference.shape[0]
+    rng = np.random.default_rng(random_state)
+    queries = rng.choice(n_rows, size=min(n_queries, n_rows), replace=False)
+
+    overlaps = []
+    taus = []
+    for idx in queries:
+        expected = _similarity_row(reference, idx)
+        actual = _similarity_row(candidate, idx)
+        expected[idx] = actual[idx] = -np.inf
+        top_expected = _top_indices(expected, k)
+        top_actual = _top_indices(actual, k)
+        if top_expected.size == 0:
+            continue
+        overlaps.append(len(set(top_expected.tolist()) & set(top_actual.tolist())) / top_expected.size)
+        union = np.union1d(top_expected, top_actual)
+        taus.append(_kendall_tau(expected[union], actual[union]) if union.size > 1 else 1.0)
+
+    return {
+        'top_k_overlap': float(np.mean(overlaps)) if overlaps else 1.0,
+        'kendall_tau': float(np.mean(taus)) if taus else 1.0,
+    }
+
+
+def accuracy_report(similarity, k=9, n_queries=500):
+    """Size and ranking agreement of every storage format against the float64 reference"""
+    if hasattr(similarity, 'tocsr'):
+        reference = similarity.tocsr().astype(np.float64)
+    else:
+        reference = np.asarray(similarity, dtype=np.float64)
+    rows = []
+    for dtype in SIMILARITY_DTYPES:
+        candidate = quantize_similarity(reference, dtype)
+        row = {'dtype': dtype, 'bytes': similarity_nbytes(candidate)}
+        row.update(ranking_agreement(reference, candidate, k=k, n_queries=n_queries))
+        rows.append(row)
+    return rows
+
+
+def print_accuracy_report(rows, k):
+    reference_bytes = rows[0]['bytes']
+    print(f"\n{'dtype':<8} {'MB':>9} {'ratio':>7} {'top-' + str(k) + ' overlap':>14} {'kendall tau':>12}")
+    for row in rows:
+        print(f"{row['dtype']:<8} {row['bytes'] / (1024 * 1024):>9.2f} {row['bytes'] / reference_bytes:>7.2f} "
+              f"{row['top_k_overlap']:>14.4f} {row['kendall_tau']:>12.4f}")
+
+
+def main(argv=None):
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Quantize the similarity data of a recommender artifact")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    report = subparsers.add_parser('report', help="Compare storage formats against float64")
+    report.add_argument('artifact')
+    report.add_argument('--k', type=int, default=9, help="Recommendations compared per query")
+    report.add_argument('--queries', type=int, default=500, help="Sampled rows")
+
+    convert = subparsers.add_parser('convert', help="Rewrite the artifact with quantized similarity")
+    convert.add_argument('artifact')
+    convert.add_argument('--dtype', choices=SIMILARITY_DTYPES, required=True)
+    convert.add_argument('--output', help="Output path (default: overwrite the artifact)")
+
+    args = parser.parse_args(argv)
+    model = joblib.load(args.artifact)
+    if 'cosine_sim' not in model:
+        parser.error("The artifact has no precomputed cosine_sim to quantize")
+
+    if args.command == 'report':
+        print_accuracy_report(accuracy_report(model['cosine_sim'], k=args.k, n_queries=args.queries), args.k)
+        return
+
+    model['cosine_sim'] = quantize_similarity(model['cosine_sim'], args.dtype)
+    model.setdefault('build_info', {})['similarity_dtype'] = args.dtype
+    output = args.output or args.artifact
+    tmp_path = output + '.tmp'
+    joblib.dump(model, tmp_path, compress=3)
+    os.replace(tmp_path, output)
+    print(f"Saved {args.dtype} similarity to {output} ({similarity_nbytes(model['cosine_sim']) / (1024 * 1024):.2f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+# src/models/update.py
+"""
+Incremental update of a recommender artifact with new titles.
+
+New documents are transformed with the artifact's saved tfidf_vectorizers and
+feature_weights, scored against the catalog's stored feature rows, and patched
+into the model without refitting anything; their rows are appended to
+feature_matrix so later updates can score against them too:
+
+    python -m src.models.update models/movie_recommender.joblib --input new_movies.json
+    python -m src.models.update models/series_recommender.joblib --ids 1399,66732
+
+The previous artifact is kept as <name>.v<version>.joblib next to the new one.
+Vectorizer vocabularies and scalers stay frozen, so schedule a full
+`python -m src.models.build` from time to time to pick up new vocabulary.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, vstack
+
+# Add the project root to sys.path so src.* imports work when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.models.build import (DEFAULT_COL_BLOCK_SIZE, DEFAULT_TOP_K, MODEL_CONFIGS, SCALED_FEATURES,
+                              StageTimer, _top_k_block, artifact_columns, build_frame, save_model)
+from src.models.catalog import load_artifact
+from src.models.content_based import catalog_feature_matrix, transform_documents
+from src.models.quantize import quantize_similarity
+
+
+def model_kind(model):
+    """'movies' or 'series' for a loaded artifact"""
+    return 'movies' if 'movies_df' in model else 'series'
+
+
+def load_new_documents(kind, input_path=None, ids=None):
+    """New detailed documents from a JSON file or from MongoDB by id"""
+    if input_path:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    from src.data.database import Database
+    config = MODEL_CONFIGS[kind]
+    projection = {field: 1 for field in config['projection']}
+    projection['_id'] = 0
+    return list(Database().db[config['collection']].find({'id': {'$in': ids}}, projection))
+
+
+def scale_new_rows(model, df, new_df):
+    """Fill *_scaled columns for new rows using the ranges of the existing catalog"""
+    scalers = model.get('scalers') or {}
+    for column in SCALED_FEATURES:
+        scaled_column = f'{column}_scaled'
+        values = pd.to_numeric(new_df[column], errors='coerce')
+        if column in scalers:
+            values = values.fillna(scalers[column].data_min_[0])
+            scaled = scalers[column].transform(values.to_numpy().reshape(-1, 1)).ravel()
+        elif column in df.columns and scaled_column in df.columns and len(df):
+            # Older artifacts have no scalers; recover the range from the stored columns
+            low = df.loc[df[scaled_column].idxmin(), column]
+            high = df.loc[df[scaled_column].idxmax(), column]
+            span = (high - low) or 1.0
+            scaled = ((values.fillna(low) - low) / span).to_numpy()
+        else:
+            scaled = np.full(len(new_df), df[scaled_column].median() if scaled_column in df.columns else 0.0)
+        # New titles may fall outside the original range
+        new_df[scaled_column] = np.clip(scaled, 0.0, 1.0)
+
+
+def _new_neighbour_candidates(catalog_features, new_features, threshold, block_size=DEFAULT_COL_BLOCK_SIZE):
+    """
+    (rows, new title positions, similarities) where an existing title's
+    similarity to a new title beats its threshold. The products are computed
+    for block_size existing titles at a time and stay sparse, so memory follows
+    the number of matches rather than catalog size x new titles.
+    """
+    new_transposed = new_features.T.tocsc()
+    rows, cols, vals = [], [], []
+    for start in range(0, catalog_features.shape[0], block_size):
+        block = (catalog_features[start:start + block_size] @ new_transposed).tocoo()
+        block_rows = block.row + start
+        beats = block.data > threshold[block_rows]
+        rows.append(block_rows[beats])
+        cols.append(block.col[beats])
+        vals.append(block.data[beats])
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def patch_similarity(cosine_sim, catalog_features, new_features, top_k):
+    """
+    Extend a top-k cosine_sim matrix with rows/columns for new titles.
+    New rows get their neighbours from the whole catalog; existing rows only
+    change when a new title beats the weakest neighbour they keep.
+    Returns a float64 CSR matrix and the number of existing rows changed.
+    """
+    if not hasattr(cosine_sim, 'tocsr'):
+        raise ValueError("Dense similarity matrices can't be patched incrementally; "
+                         "rebuild the artifact with `python -m src.models.build`")
+    old = cosine_sim.tocsr()
+    n_old = old.shape[0]
+    n_new = new_features.shape[0]
+    n_total = n_old + n_new
+
+    # Neighbours of the new titles against old + new, blocked like the full build
+    all_features = vstack([catalog_features, new_features], format='csr')
+    new_rows, new_cols, new_vals = _top_k_block(all_features, all_features.T.tocsc(), n_old, n_total,
+                                                min(top_k, n_total), DEFAULT_COL_BLOCK_SIZE)
+
+    row_nnz = np.diff(old.indptr)
+    weakest = np.zeros(n_old)
+    nonempty = row_nnz > 0
+    if nonempty.any():
+        weakest[nonempty] = np.minimum.reduceat(old.data, old.indptr[:-1][nonempty])
+    # Rows that don't have top_k neighbours yet accept any positive similarity
+    threshold = np.where(row_nnz >= top_k, weakest, 0.0)
+    cross_rows, cross_cols, cross_vals = _new_neighbour_candidates(catalog_features, new_features, threshold)
+    affected = np.unique(cross_rows)
+
+    keep = np.ones(n_old, dtype=bool)
+    keep[affected] = False
+    old_rows = np.repeat(np.arange(n_old), row_nnz)
+    kept = keep[old_rows]
+
+    # Affected rows: their current neighbours followed by the new titles that beat them,
+    # reduced to the top_k per row (a stable sort, so ties keep the current neighbour)
+    rows = np.concatenate([old_rows[~kept], cross_rows])
+    cols = np.concatenate([old.indices[~kept], n_old + cross_cols])
+    vals = np.concatenate([old.data[~kept], cross_vals])
+    order = np.lexsort((-vals, rows))
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if rows.size else np.zeros(0, dtype=int)
+    rank = np.arange(rows.size) - np.repeat(starts, np.diff(np.r_[starts, rows.size]))
+    top = (rank < top_k) & (vals > 0)
+
+    patched = csr_matrix((np.concatenate([old.data[kept], new_vals, vals[top]]),
+                          (np.concatenate([old_rows[kept], new_rows, rows[top]]),
+                           np.concatenate([old.indices[kept], new_cols, cols[top]]))),
+                         shape=(n_total, n_total))
+    return patched, len(affected)
+
+
+def similarity_dtype(model):
+    """Storage dtype of the artifact's cosine_sim, from its build info or the matrix itself"""
+    dtype = model.get('build_info', {}).get('similarity_dtype')
+    return dtype or str(getattr(model['cosine_sim'], 'dtype', 'float64'))
+
+
+def update_model(model, documents, timer=None):
+    """Add new titles to a loaded artifact in place and return the number added"""
+    timer = timer or StageTimer()
+    kind = model_kind(model)
+    config = MODEL_CONFIGS[kind]
+    df_key = config['df_key']
+    df = model[df_key]
+
+    known_ids = set(df['id'].tolist())
+    documents = [doc for doc in documents if doc.get('id') is not None and doc['id'] not in known_ids]
+    if not documents:
+        print("No new titles to add")
+        return 0
+
+    with timer.stage('extract'):
+        new_df = build_frame(kind, documents)
+        scale_new_rows(model, df, new_df)
+    print(f"Adding {len(new_df)} new {kind}")
+
+    text_columns = [f'{name}_text' for name in model['tfidf_vectorizers']]
+    with timer.stage('transform'):
+        new_features = transform_documents(new_df[text_columns].to_dict('records'), model)
+
+    # Every backend keeps the feature rows in the artifact; older artifacts
+    # without them pay for one full transform here, and then store them too
+    with timer.stage('catalog-features'):
+        catalog_features = catalog_feature_matrix(model)
+
+    backend = model.get('similarity_backend', 'matrix')
+    if backend == 'ann':
+        with timer.stage('index'):
+            model['ann_index'].add(new_features)
+    elif backend != 'features':
+        top_k = model.get('build_info', {}).get('top_k') or DEFAULT_TOP_K
+        dtype = similarity_dtype(model)
+        with timer.stage('similarity'):
+            patched, n_patched = patch_similarity(model['cosine_sim'], catalog_features, new_features, top_k)
+        # Store the patched matrix in the artifact's format again, as build_info records it
+        model['cosine_sim'] = quantize_similarity(patched, dtype)
+        print(f"Patched the neighbour lists of {n_patched} existing titles")
+
+    with timer.stage('append'):
+        model['feature_matrix'] = vstack([catalog_features, new_features], format='csr')
+
+    # Only the columns the artifact already stores
+    columns = [column for column in df.columns if column in new_df.columns] or artifact_columns(kind)
+    model[df_key] = pd.concat([df, new_df[columns]], ignore_index=True)
+    model['indices'] = pd.Series(model[df_key].index, index=model[df_key][config['title_field']])
+
+    build_info = dict(model.get('build_info', {}))
+    build_info['version'] = build_info.get('version', 1) + 1
+    build_info['updated_at'] = datetime.now(timezone.utc).isoformat()
+    build_info['n_titles'] = len(model[df_key])
+    build_info['n_added'] = len(new_df)
+    build_info['update_timings'] = timer.timings
+    model['build_info'] = build_info
+    return len(new_df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add new titles to a recommender artifact without a full rebuild")
+    parser.add_argument('artifact', help="Path to movie_recommender.joblib or series_recommender.joblib")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', help="JSON file with new detailed documents")
+    source.add_argument('--ids', help="Comma separated ids to fetch from MongoDB")
+    parser.add_argument('--output', help="Where to write the updated artifact (default: overwrite the input)")
+    parser.add_argument('--compress', type=int, default=3, help="joblib compression level (0 disables)")
+    args = parser.parse_args(argv)
+
+    timer = StageTimer()
+    with timer.stage('load-model'):
+        # Every column, including the *_text columns the feature rows are rebuilt from
+        model = load_artifact(args.artifact, columns=None)
+    kind = model_kind(model)
+    uses_catalog = 'catalog' in model
+
+    with timer.stage('load-documents'):
+        ids = [int(value) for value in args.ids.split(',')] if args.ids else None
+        documents = load_new_documents(kind, input_path=args.input, ids=ids)
+    print(f"Loaded {len(documents)} candidate documents")
+
+    version = model.get('build_info', {}).get('version', 1)
+    try:
+        added = update_model(model, documents, timer=timer)
+    except ValueError as e:
+        parser.error(str(e))
+    if added == 0:
+        return
+
+    output = args.output or args.artifact
+    if os.path.abspath(output) == os.path.abspath(args.artifact):
+        # Keep the version being replaced for rollback
+        base, extension = os.path.splitext(args.artifact)
+        previous = f'{base}.v{version}{extension}'
+        shutil.copy2(args.artifact, previous)
+        print(f"Previous model kept as {previous}")
+
+    with timer.stage('save'):
+        save_model(model, output, compress=args.compress, catalog=uses_catalog)
+    timer.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -13,11 +13,28 @@ sys.path.append(current_dir)  # Add web directory to path
 load_dotenv(dotenv_path="..\\data\\.env")
 
 def create_app():
+    # Queued, level-gated logging for the app and the modules it uses (LOG_LEVEL, LOG_FORMAT)
+    sys.path.append(os.path.dirname(current_dir))
+    from src.logs import configure_logging
+    configure_logging()
+    
     app = Flask(__name__)
     
     # Configure app
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key')
-    app.config['MODEL_PATH'] = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+    app.config['MODEL_PATH'] = os.getenv('MODEL_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models'))
+    # Optional object storage the models are fetched from (s3://bucket/prefix)
+    app.config['MODEL_STORE_URL'] = os.getenv('MODEL_STORE_URL')
+    app.config['MODEL_STORE_ENDPOINT'] = os.getenv('MODEL_STORE_ENDPOINT')
+    app.config['PRELOAD_MODELS'] = os.getenv('PRELOAD_MODELS', '0') == '1'
+    # Where titles are read from: 'mongo', 'json' or 'sqlite' (see src/data/storage.py)
+    app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'mongo')
+    app.config['JSON_DATA_DIR'] = os.getenv('JSON_DATA_DIR', 'data/processed')
+    app.config['SQLITE_PATH'] = os.getenv('SQLITE_PATH', os.path.join('data', 'processed', 'imdb_recommender.sqlite'))
+    # Read-through cache in front of MongoDB/SQLite lookups (0 MB disables it)
+    app.config['STORAGE_CACHE_MB'] = float(os.getenv('STORAGE_CACHE_MB', '64'))
+    app.config['STORAGE_CACHE_TTL'] = float(os.getenv('STORAGE_CACHE_TTL', '600'))
+    app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL')
     
     # Configure logging
     if not app.debug:
@@ -32,6 +49,10 @@ def create_app():
     app.register_blueprint(analysis_bp)
     app.register_blueprint(recommender_bp)
     
+    # Request spans, the Server-Timing header and /metrics (INSTRUMENTATION=0 disables them)
+    from src.instrumentation import init_app as init_instrumentation
+    init_instrumentation(app)
+    
     # Register error handlers
     @app.errorhandler(404)
     def page_not_found(e):
@@ -50,10 +71,12 @@ def create_app():
         # Return 500 page
         return render_template('500.html'), 500
     
-    # Load models when app starts
-    with app.app_context():
-        from web.routes.recommender import load_models  # Import your function
-        load_models()
+    # Models load lazily on the first request that needs them; set
+    # PRELOAD_MODELS=1 to pay that cost at startup instead
+    if app.config['PRELOAD_MODELS']:
+        from routes.recommender import load_models
+        with app.app_context():
+            load_models()
     
     return app
 
@@ -7,9 +7,6 @@ import sys
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-# Import Database class
-from src.data.database import Database
-
 # Create blueprint
 analysis_bp = Blueprint('analysis', __name__)
 